@@ -0,0 +1,610 @@
+#
+# ASGI version of the UConDB server
+#
+# Exposes the same URLs as the WSGI application (ServerApp.py) and uses the same configuration file.
+# Reads are served with the asyncpg based ucondb.UConDB_async API and responses are streamed with async generators.
+# Writes run the synchronous API in executor threads.
+#
+# Run with any ASGI server, e.g.:
+#   UCONDB_CFG=config.yaml uvicorn AsyncServerApp:application --port 8080
+#
+
+import asyncio, json, os, re, socket, sys, time, zlib
+from urllib.parse import parse_qsl, unquote
+import yaml
+
+from ucondb import Signature, Version
+from ucondb.UConDB_async import AsyncUConDB
+from ucondb.UConDB import UCDReplayCache, UCDSharedSalts, UCDIntervalIndexCache, UCDChangeListener
+from ucondb.tools import text2datetime, epoch, QueryStats
+import rfc2617
+
+Unsafe = "<'>\\|;" + '"'
+
+COMPRESS_LIMIT = 10*1024        # do not try to compress short blobs
+
+CompressionLevels = {
+    "default":  zlib.Z_DEFAULT_COMPRESSION,
+    "fast":  zlib.Z_BEST_SPEED,
+    "best":  zlib.Z_BEST_COMPRESSION,
+    "no":  "no"
+}
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        self.Status = status
+        self.Message = message
+
+class Request(object):
+
+    def __init__(self, scope, body):
+        self.Scope = scope
+        self.Method = scope["method"].lower()
+        path = scope["path"].strip("/")
+        words = path.split("/", 1)
+        self.Endpoint = words[0]
+        self.RelPath = words[1] if len(words) > 1 else ""
+        # same as webpie: repeated arguments become lists of values, e.g. "tag=a&tag=b"
+        self.Args = {}
+        for k, v in parse_qsl(scope.get("query_string", b"").decode("utf-8")):
+            if any(x in Unsafe for x in v):
+                raise HTTPError(400, "Invalid argument value")
+            if k in self.Args:
+                values = self.Args[k]
+                self.Args[k] = (values if isinstance(values, list) else [values]) + [v]
+            else:
+                self.Args[k] = v
+        self.Headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        self.Body = body
+
+    def environ(self):
+        # WSGI-like environment for rfc2617
+        return {
+            "REQUEST_METHOD":       self.Scope["method"],
+            "HTTP_AUTHORIZATION":   self.Headers.get("authorization", "")
+        }
+
+    def params(self):
+        # same as UConDBHandler.parseArgs
+        d = {}
+        if self.RelPath:
+            for w in self.RelPath.split('/'):
+                if any(x in Unsafe for x in w):
+                    raise HTTPError(400, "Invalid path element")
+                kv = tuple(w.split('=',1))
+                if len(kv) > 1:
+                    k, v = kv
+                else:
+                    k = "object" if "folder" in d else "folder"
+                    v = kv[0]
+                if k in d:
+                    raise HTTPError(400, "Value for %s specified twice in the URL" % (k,))
+                d[k] = v
+        for k, v in self.Args.items():
+            if k in d:
+                raise HTTPError(400, "Value for %s specified twice in the URL" % (k,))
+            d[k] = v
+        return d
+
+async def json_seq(versions):
+    # versions: async iterable of dictionaries
+    async for x in versions:
+        yield ("\x1E" + json.dumps(x) + "\n").encode("utf-8")
+
+async def json_list(dicts):
+    yield b"["
+    first = True
+    async for x in dicts:
+        yield ((", " if not first else "") + json.dumps(x)).encode("utf-8")
+        first = False
+    yield b"]"
+
+def format_blob(specs, blob, compression_level):
+    compressed = False
+    if compression_level != "no" and len(blob) >= COMPRESS_LIMIT:
+        compressed = True
+        blob = zlib.compress(blob, level=compression_level)
+    specs = ",".join([str(spec) for spec in specs])
+    flags = ("z" if compressed else "-") + ","      # flags + specs delimiter
+    header = ("%s %s %d:" % (flags, specs, len(blob))).encode("utf-8")
+    return header + blob
+
+class KeyLocks(object):
+    # asyncio version of handler.KeyLocks: serializes writes to the same object within the process
+
+    def __init__(self):
+        self.Locks = {}             # {key: [asyncio.Lock, number of users]}
+
+    class KeyLock(object):
+
+        def __init__(self, registry, key):
+            self.Registry = registry
+            self.Key = key
+
+        async def __aenter__(self):
+            entry = self.Registry.Locks.setdefault(self.Key, [asyncio.Lock(), 0])
+            entry[1] += 1
+            await entry[0].acquire()
+            return self
+
+        async def __aexit__(self, *args):
+            entry = self.Registry.Locks[self.Key]
+            entry[0].release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.Registry.Locks[self.Key]
+
+    def __call__(self, *key):
+        return self.KeyLock(self, key)
+
+class UConDBAsyncApp(object):
+
+    Endpoints = ["version", "probe", "get", "put", "data", "tag", "get_blob", "objects", "tags", "folders", "create_folder",
+            "versions", "lookup_versions", "resolve_versions", "latest_versions", "data_for_versions", "query_stats"]
+
+    def __init__(self, config_file=None):
+        self.Config = yaml.load(open(config_file or os.environ["UCONDB_CFG"], "r"), Loader = yaml.SafeLoader)
+        meta_cfg = self.Config["Metadata"]
+        data_cfg = self.Config["Data"]
+        assert data_cfg.get("type", "postgres") == "postgres", "Only Postgres data storage is supported"
+        self.DefaultNamespace = meta_cfg.get("namespace") or "public"
+        self.ServerConfig = self.Config["Server"]
+
+        # notifications, interval_index, query_stats and slow_query_threshold: same as in ServerApp.DBConnection
+        notifications = self.ServerConfig.get("notifications", False)
+        if notifications is True:
+            notifications = "ucondb_changes"
+        self.NotifyChannel = notifications or None
+        self.IntervalIndex = None
+        if self.ServerConfig.get("interval_index", False):
+            if self.NotifyChannel is None:
+                raise ValueError("Server.interval_index requires Server.notifications to be enabled")
+            self.IntervalIndex = UCDIntervalIndexCache()
+        self.Listener = None
+        self.QueryStats = None
+        if self.ServerConfig.get("query_stats", False) or self.ServerConfig.get("slow_query_threshold") is not None:
+            self.QueryStats = QueryStats(slow_threshold=self.ServerConfig.get("slow_query_threshold"))
+
+        self.DB = AsyncUConDB(self.connStr(meta_cfg), self.connStr(data_cfg), default_namespace=self.DefaultNamespace,
+                    data_namespace=data_cfg.get("namespace") or "public",
+                    max_size=self.ServerConfig.get("db_pool_size", 10),
+                    notify_channel=self.NotifyChannel, interval_index=self.IntervalIndex, instrumentation=self.QueryStats)
+        self.Authentication = self.ServerConfig.get('authentication', "RFC2617")
+        assert self.Authentication in ("RFC2617", "none"), "Unknown authentication method: %s" % (self.Authentication,)
+        self.ServerPassword = self.ServerConfig.get("password")
+        self.Passwords = self.Config.get("Authorization", {})
+        self.ReadOnly = self.ServerConfig.get("read_only", False)
+        self.WriteLocks = KeyLocks()
+        shared_salts = UCDSharedSalts(self.DB.syncDB()) if self.ServerConfig.get("replay_shared", False) else None
+        self.ReplayCache = UCDReplayCache(ttl=self.ServerConfig.get("replay_ttl", 600), shared=shared_salts)
+
+    @staticmethod
+    def connStr(cfg):
+        connstr = "host=%(host)s port=%(port)s user=%(user)s dbname=%(dbname)s" % cfg
+        if cfg.get("password"):
+            connstr += " password=" + cfg.get("password")
+        return connstr
+
+    def getPassword(self, folder, user):
+        folder_dict = self.Passwords.get(folder, self.Passwords.get('*', {'*':None}))
+        return folder_dict.get(user, folder_dict.get('*', None))
+
+    #
+    # ASGI interface
+    #
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.DB.connect()
+                if self.NotifyChannel is not None:
+                    # started in each worker process, after it was forked
+                    self.Listener = UCDChangeListener(self.DB.ConnStr, channel=self.NotifyChannel,
+                            interval_index=self.IntervalIndex, folder_cache=self.DB.FolderCache,
+                            default_namespace=self.DefaultNamespace)
+                    self.Listener.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.Listener is not None:
+                    self.Listener.stop()
+                    self.Listener = None
+                await self.DB.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def read_body(self, receive):
+        body = b""
+        more = True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+        return body
+
+    async def http(self, scope, receive, send):
+        try:
+            request = Request(scope, await self.read_body(receive))
+            if request.Endpoint not in self.Endpoints:
+                raise HTTPError(404, "Not found")
+            status, headers, body = await getattr(self, request.Endpoint)(request)
+        except HTTPError as e:
+            status, headers, body = e.Status, {"Content-Type": "text/plain"}, e.Message
+        except Exception as e:
+            status, headers, body = 500, {"Content-Type": "text/plain"}, "Error: %s %s" % (type(e).__name__, e)
+
+        headers = dict(headers)
+        headers["X-Actual-Server"] = socket.gethostname()
+        headers["X-Server-Application-Version"] = "UConDB %s" % (Version,)
+        headers["Access-Control-Allow-Origin"] = "*"
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if isinstance(body, bytes):
+            headers["Content-Length"] = str(len(body))
+        await send({"type": "http.response.start", "status": status,
+                "headers": [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in headers.items()]})
+        if isinstance(body, bytes):
+            await send({"type": "http.response.body", "body": body})
+        else:
+            async for chunk in body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+    #
+    # Helpers
+    #
+
+    async def folder(self, name):
+        f = await self.DB.getFolder(name) if name else None
+        if f is None:
+            raise HTTPError(404, f"Folder {name} not found")
+        return f
+
+    async def object(self, folder, name):
+        o = await folder.getObject(name) if name else None
+        if o is None:
+            raise HTTPError(404, f"Object {name} not found")
+        return o
+
+    async def authenticate(self, request, folder_name):
+        if 'x-ucondb-authenticator' in request.Headers:
+            authenticator = request.Headers['x-ucondb-authenticator']
+            def get_password(user):
+                return self.ServerPassword if user == "*" else self.getPassword(folder_name, user)
+            if not authenticator or not Signature(folder_name, request.Body).verify(authenticator, get_password):
+                raise HTTPError(401, "Authentication falied")
+            salt = authenticator.split(":", 3)[2]
+            if self.ReplayCache.Shared is None:
+                fresh = self.ReplayCache.check(folder_name, salt)
+            else:
+                fresh = await asyncio.get_running_loop().run_in_executor(None, self.ReplayCache.check, folder_name, salt)
+            if not fresh:
+                raise HTTPError(401, "Authentication falied")
+        elif self.Authentication == "RFC2617":
+            ok, header = rfc2617.digest_server(folder_name, request.environ(), self.getPassword)
+            if not ok:
+                return 401, {"Content-Type": "text/plain", "WWW-Authenticate": header} if header else {}, "Authorization required"
+        return None
+
+    #
+    # Endpoints
+    #
+
+    async def version(self, request):
+        return 200, {"Content-Type": "text/plain"}, Version
+
+    async def probe(self, request):
+        try:
+            pool = await self.DB.connect()
+            x = await pool.fetchval("select 1")
+            if x != 1:
+                raise ValueError("Data mismatch. Expected 1, got %s" % (x,))
+            return 200, {"Content-Type": "text/plain"}, "OK"
+        except Exception as e:
+            return 200, {"Content-Type": "text/plain"}, "Error: %s %s" % (type(e), e)
+
+    async def query_stats(self, request):
+        # per-query statistics collected if enabled in the server configuration
+        if self.QueryStats is None:
+            raise HTTPError(404, "Query statistics are not enabled")
+        report = self.QueryStats.report()
+        if request.Args.get("reset") == "yes":
+            self.QueryStats.reset()
+        return 200, {"Content-Type": "text/json"}, json.dumps(report, indent=1)
+
+    async def data(self, request):
+        if request.Method in ("put", "post"):
+            return await self.put(request)
+        else:
+            return await self.get(request)
+
+    async def get(self, request):
+        params = request.params()
+        folder_name = params.get("folder")
+        object_name = params.get("object")
+        if folder_name is None or object_name is None:
+            raise HTTPError(400, "Folder and object must be specified")
+        folder = await self.folder(folder_name)
+        meta_only = params.get("meta_only", "no") == "yes"
+        version_id = params.get("id")
+        if version_id is not None:
+            v = await folder.getVersionByID(int(version_id))
+            if meta_only:
+                return 200, {"Content-Type": "text/json"}, json.dumps({} if v is None else v.metadata)
+            if v is None:
+                raise HTTPError(404, "Version not found")
+            return 200, {"Content-Type": "application/octet-stream"}, await v.data()
+
+        o = await self.object(folder, object_name)
+        data_key = params.get("data_key")
+        if data_key is not None:
+            data = await folder.getDataByDataKey(data_key)
+            if data is None:
+                raise HTTPError(404, "Data not found")
+            return 200, {
+                    "Content-Type": "application/octet-stream",
+                    "X-UConDB-product-version":  Version,
+                    "X-UConDB-data-key":    data_key
+                }, data
+
+        tr = params.get("tr")
+        if tr:  tr = text2datetime(tr)
+        tv = params.get("tv")
+        tv = float(tv) if tv else time.time()
+        if params.get("key") is not None:
+            v = await o.getVersion(key=params["key"])
+        elif params.get("tag") is not None:
+            v = await o.getVersion(tag=params["tag"])
+        else:
+            v = await o.getVersion(tv=tv, tr=tr or None)
+        if v is None:
+            raise HTTPError(404, "Version not found")
+        meta_json = json.dumps(v.metadata)
+        if meta_only:
+            return 200, {"Content-Type": "text/json"}, meta_json
+        return 200, {
+                "Content-Type": "application/octet-stream",
+                "X-UConDB-product-version":  Version,
+                "X-UConDB-version-id":  str(v.ID),
+                "X-UConDB-data-key":    v.DataKey,
+                "X-UConDB-version-key":         v.Key or "null",
+                "X-UConDB-data-size":   str(v.DataSize),
+                "X-UConDB-adler32":     str(v.Adler32),
+                "X-UConDB-tv":          str(v.Tv),
+                "X-UConDB-tr":          str(epoch(v.Tr)),
+                "X-UConDB-metadata":    meta_json,
+                "X-UConDB-metadata-format":    "text/json"
+            }, await v.data()
+
+    async def put(self, request):
+        if self.ReadOnly:
+            raise HTTPError(405, "Read-only instance")
+        params = request.params()
+        folder = await self.folder(params.get("folder"))
+        object_name = params.get("object")
+        if object_name is None:
+            raise HTTPError(400, "Object must be specified")
+        failed = await self.authenticate(request, folder.Name)
+        if failed:  return failed
+        tags = params.get("tag", [])
+        if isinstance(tags, str):
+            tags = [tags]
+        tv = params.get("tv")
+        tv = float(tv) if tv else None
+        o = folder.createObject(object_name)
+        async with self.WriteLocks(folder.Name, object_name):
+            v = await o.createVersion(request.Body, tv, tags=tags, key=params.get("key"),
+                        override_key=params.get("override", "no") == "yes")
+        if params.get("full_meta", "no") == "yes":
+            return 200, {"Content-Type": "text/json"}, json.dumps(v.metadata)
+        return 200, {"Content-Type": "text/plain"}, str(v.ID)
+
+    async def tag(self, request):
+        if self.ReadOnly:
+            raise HTTPError(405, "Read-only instance")
+        args = request.Args
+        folder_name, tag, version_id = args.get("folder"), args.get("tag"), args.get("version_id")
+        if not folder_name or not tag:
+            raise HTTPError(400, "Folder and tag must be specified")
+        folder = await self.folder(folder_name)
+        if request.Method == "post" and request.Body:
+            # bulk tagging, see UConDBHandler.tag
+            failed = await self.authenticate(request, folder.Name)
+            if failed:  return failed
+            specs = json.loads(request.Body)
+            tagged = await self.DB.runSync(lambda db: db.getFolder(folder.Name).tagVersions(tag, ids=specs.get("ids"), 
+                        keys=specs.get("keys"), tv=specs.get("tv"), tr=specs.get("tr"), objects=specs.get("objects")))
+            return 200, {"Content-Type": "text/json"}, json.dumps(tagged)
+        if version_id is None:
+            o = await self.object(folder, args.get("object"))
+            v = await o.getVersion(key=args.get("key"))
+        else:
+            v = await folder.getVersionByID(int(version_id))
+        if v is None:
+            raise HTTPError(404, "Version not found")
+        vid = v.ID
+        async with self.WriteLocks(folder.Name, v.Object.Name):
+            await self.DB.runSync(lambda db: db.getFolder(folder.Name).getVersionByID(vid).addTag(tag))
+        return 200, {"Content-Type": "text/plain"}, "OK"
+
+    async def create_folder(self, request):
+        if self.ReadOnly:
+            raise HTTPError(405, "Read-only instance")
+        args = request.Args
+        folder_name = args.get("folder")
+        if not folder_name:
+            raise HTTPError(400, "Empty folder name")
+        failed = await self.authenticate(request, folder_name)
+        if failed:  return failed
+        grants = {'r': [x for x in args.get("read", "").split(",") if x], 'w': [x for x in args.get("write", "").split(",") if x]}
+        await self.DB.runSync(lambda db: db.createFolder(folder_name, owner=args.get("owner"), grants=grants,
+                        drop_existing=args.get("drop") == "yes"))
+        return 200, {"Content-Type": "text/plain"}, "OK"
+
+    async def get_blob(self, request):
+        args = request.Args
+        data_key, version_id = args.get("data_key"), args.get("version_id")
+        if (data_key is None) == (version_id is None):
+            raise HTTPError(400, "One and only one of data_key, version_id must be specified")
+        folder = await self.folder(args.get("folder") or request.RelPath)
+        if data_key is None:
+            v = await folder.getVersionByID(int(version_id))
+            if v is None:
+                raise HTTPError(404, "Version not found")
+            blob = await v.data()
+        else:
+            blob = await folder.getDataByDataKey(data_key)
+        if blob is None:
+            raise HTTPError(404, "Data not found")
+        compression_level = CompressionLevels[args.get("compress", "no")]
+        headers = {"Content-Type":"application/octet-stream"}
+        if compression_level != "no" and len(blob) >= COMPRESS_LIMIT:
+            blob = zlib.compress(blob, level=compression_level)
+            headers["Transfer-Encoding"] = "deflate"
+        return 200, headers, blob
+
+    async def objects(self, request):
+        folder = await self.folder(request.Args.get("folder"))
+        names = [o.Name for o in await folder.listObjects()]
+        if request.Args.get("format", "json") == "json":
+            return 200, {"Content-Type": "text/json"}, json.dumps(names)
+        return 200, {"Content-Type": "text/csv"}, "Name\n" + "\n".join(names)
+
+    async def tags(self, request):
+        folder = await self.folder(request.Args.get("folder"))
+        tags = await self.DB.runSync(lambda db: db.getFolder(folder.Name).listTags())
+        if request.Args.get("format", "json") == "json":
+            return 200, {"Content-Type": "text/json"}, json.dumps(tags)
+        return 200, {"Content-Type": "text/csv"}, "Name\n" + "\n".join(tags)
+
+    async def folders(self, request):
+        namespace = request.Args.get("namespace") or self.DefaultNamespace
+        folders = await self.DB.runSync(lambda db: [f.Name for f in db.listFolders(namespace)])
+        if request.Args.get("format", "json") == "json":
+            return 200, {"Content-Type": "text/json"}, json.dumps(folders)
+        return 200, {"Content-Type": "text/csv"}, "Name\n" + "\n".join(folders)
+
+    async def versions(self, request):
+        args = request.Args
+        folder = await self.folder(args.get("folder"))
+        o = await self.object(folder, args.get("object"))
+        tv = float(args["tv"]) if args.get("tv") else time.time()
+        tr = text2datetime(args["tr"]) if args.get("tr") else None
+        tr_since = text2datetime(args["tr_since"]) if args.get("tr_since") else None
+        after = args.get("after")
+        headers = {"Content-Type": "text/json"}
+        if args.get("limit") is None:
+            versions = o.listVersions(tr=tr, tv=tv, tr_since=tr_since, after=after)
+        else:
+            limit = int(args["limit"])
+            lst = [v async for v in o.listVersions(tr=tr, tv=tv, tr_since=tr_since, after=after, limit=limit+1)]
+            if len(lst) > limit:
+                lst = lst[:limit]
+                headers["X-UConDB-next-page"] = lst[-1].pageToken()
+            async def listed():
+                for v in lst:
+                    yield v
+            versions = listed()
+        return 200, headers, json_list(v.as_jsonable() async for v in versions)
+
+    async def lookup_versions(self, request):
+        if request.Method != "post":
+            raise HTTPError(405, "POST method is required")
+        specs = json.loads(request.Body)
+        words = (request.RelPath.split("/", 1) + [None, None])[:2]
+        folder = await self.folder(words[0] or request.Args.get("folder"))
+        object_name = words[1] or request.Args.get("object")
+        o = await self.object(folder, object_name) if object_name else None
+        tr = request.Args.get("tr")
+        tr = float(tr) if tr else None
+        tag = request.Args.get("tag")
+        ids, keys, tvs = specs.get("ids"), specs.get("keys"), specs.get("tvs")
+        key_min, key_max = specs.get("key_min"), specs.get("key_max")
+        if ids:
+            stream = (v.as_jsonable() async for v in folder.getVersionsByIDs(ids))
+        elif keys or key_min or key_max:
+            if o is None:
+                raise HTTPError(400, "Object name must be specified")
+            stream = (v.as_jsonable() async for v in o.getVersionsByKeys(keys, key_min, key_max))
+        elif tvs:
+            if o is None:
+                raise HTTPError(400, "Object name must be specified")
+            stream = (v.set_lookup_tv(tv).as_jsonable() async for tv, v in o.getVersionsByTvs(tvs, tag=tag, tr=tr))
+        else:
+            raise HTTPError(400, "One of ids, keys, key_min/key_max or tvs must be specified")
+        return 200, {"Content-Type": "text/json-seq"}, json_seq(stream)
+
+    async def resolve_versions(self, request):
+        if request.Method != "post":
+            raise HTTPError(405, "POST method is required")
+        specs = json.loads(request.Body)
+        folder = await self.folder(request.RelPath or request.Args.get("folder"))
+        if "lookups" in specs:
+            lookups = specs["lookups"]
+        else:
+            tv = float(specs.get("tv", time.time()))
+            lookups = [(o, tv) for o in specs.get("objects", [])]
+        tr = request.Args.get("tr")
+        tr = float(tr) if tr else None
+        versions = folder.resolveVersions(lookups, tag=request.Args.get("tag"), tr=tr)
+        return 200, {"Content-Type": "text/json-seq"}, json_seq(v.set_lookup_tv(tv).as_jsonable() async for _, tv, v in versions)
+
+    async def latest_versions(self, request):
+        folder = await self.folder(request.RelPath or request.Args.get("folder"))
+        objects = request.Args.get("objects")
+        names = [o for o in objects.split(",") if o] if objects else None
+        return 200, {"Content-Type": "text/json-seq"}, json_seq(v.as_jsonable() async for v in folder.latestVersions(names))
+
+    async def data_for_versions(self, request):
+        args = request.Args
+        filter = unquote(args.get("filter") or "") or None
+        ids = args.get("ids")
+        if ids:
+            ids = [int(x) for x in ids.strip().split(",")]
+        else:
+            if request.Method != "post":
+                raise HTTPError(405, "POST method is required")
+            params = json.loads(request.Body)
+            ids = params["ids"]
+            filter = params.get("filter")
+        filter_re = re.compile(filter.encode("utf-8") if isinstance(filter, str) else filter) if filter else None
+        folder = await self.folder(args.get("folder") or request.RelPath)
+        compression_level = CompressionLevels[args.get("compress", "no")]
+
+        data_key_to_vids = {}       # { data_key -> [version ids] }, multiple versions may be sharing the same blob
+        async for v in folder.getVersionsByIDs(ids):
+            data_key_to_vids.setdefault(v.DataKey, []).append(v.ID)
+
+        def transform_blob(blob):
+            if filter_re is None:
+                return blob
+            m = filter_re.search(blob)
+            if m is None:
+                return None
+            unnamed = [x.decode("utf-8", "replace") if isinstance(x, bytes) else x for x in m.groups()]
+            named = {k: (x.decode("utf-8", "replace") if isinstance(x, bytes) else x) for k, x in m.groupdict().items()}
+            if not named:
+                return json.dumps(unnamed).encode("utf-8")
+            named["__unnamed__"] = unnamed
+            return json.dumps(named).encode("utf-8")
+
+        async def stream():
+            async for data_key, blob in folder.getDataByDataKeys(list(data_key_to_vids.keys())):
+                blob = transform_blob(blob)
+                vids = data_key_to_vids.get(data_key)
+                if blob is not None and vids:
+                    yield format_blob(vids, blob, compression_level)
+
+        return 200, {"Content-Type": "application/octet-stream"}, stream()
+
+def create_application(config_file=None):
+    return UConDBAsyncApp(config_file=config_file)
+
+application = create_application()
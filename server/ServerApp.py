@@ -5,6 +5,7 @@ from UI import UConDBUIHandler
 from wsdbtools import ConnectionPool
 
 from ucondb import UConDB, Version
+from ucondb.UConDB import UCDIntervalIndexCache, UCDChangeListener, UCDReplayCache, UCDSharedSalts
 from ucondb.backends import UCDPostgresDataStorage
 
 try:    from ucondb.backends import UCDCouchBaseDataStorage
@@ -12,13 +13,13 @@ except: UCDCouchBaseDataStorage = None      # cannot import couchbase ?
 
 import time, sys, hashlib, os, random, threading, re, json
 from datetime import datetime, timedelta, tzinfo
-from ucondb.tools import text2datetime, epoch, fromepoch, to_bytes, to_str
+from ucondb.tools import text2datetime, epoch, fromepoch, to_bytes, to_str, QueryStats
 from threading import RLock, Lock, Condition
 import socket
 from base64 import *
 from hashlib import md5
 
-from handler import UConDBHandler
+from handler import UConDBHandler, KeyLocks
 
 class DBConfig(object):
 
@@ -60,6 +61,7 @@ class DBConnection(object):
         if meta_cfg.get("password"):
             connstr += " password=" + meta_cfg.get("password")
         self.MetaNamespace = meta_cfg.get("namespace") or "public"
+        self.MetaConnStr = connstr
         self.MetaConnPool = ConnectionPool(postgres=connstr, idle_timeout=5)
         
         data_cfg = cfg["Data"]
@@ -81,9 +83,51 @@ class DBConnection(object):
                 connstr += " password=" + data_cfg.get("password")
             self.DataNamespace = data_cfg.get("namespace") or "public"
             self.DataConnPool = ConnectionPool(postgres=connstr, idle_timeout=5)
+        self.DataStore = None
+
+        server_cfg = cfg.get("Server", {})
+        # notifications: true or channel name - send change notifications and listen to the ones sent by other server processes
+        notifications = server_cfg.get("notifications", False)
+        if notifications is True:
+            notifications = "ucondb_changes"
+        self.NotifyChannel = notifications or None
+
+        # the interval index sees versions created by other server processes only through the notifications
+        self.IntervalIndex = None
+        if server_cfg.get("interval_index", False):
+            if self.NotifyChannel is None:
+                raise ValueError("Server.interval_index requires Server.notifications to be enabled")
+            self.IntervalIndex = UCDIntervalIndexCache()
+        self.Listener = None
+        self.ListenerPID = None
+        self.ListenerLock = Lock()
+
+        # replay protection for signed requests: salts are remembered for replay_ttl seconds, in this process
+        # and, if replay_shared is true, in a table shared with other server processes
+        shared_salts = None
+        if server_cfg.get("replay_shared", False):
+            shared_salts = UCDSharedSalts(UConDB(self.MetaConnPool, None, default_namespace=self.MetaNamespace))
+        self.ReplayCache = UCDReplayCache(ttl=server_cfg.get("replay_ttl", 600), shared=shared_salts)
+
+        # query_stats: true - collect per-query statistics, shown by the query_stats endpoint
+        # slow_query_threshold: seconds, log slower queries
+        self.QueryStats = None
+        if server_cfg.get("query_stats", False) or server_cfg.get("slow_query_threshold") is not None:
+            self.QueryStats = QueryStats(slow_threshold=server_cfg.get("slow_query_threshold"))
+
+    def startListener(self):
+        # the listener thread is started in each server process on first use, after the process was forked
+        if self.NotifyChannel is not None and self.ListenerPID != os.getpid():
+            with self.ListenerLock:
+                if self.ListenerPID != os.getpid():
+                    self.ListenerPID = os.getpid()
+                    self.Listener = UCDChangeListener(self.MetaConnStr, channel=self.NotifyChannel, 
+                            interval_index=self.IntervalIndex, folder_cache=UConDB.FolderCache,
+                            default_namespace=self.MetaNamespace)
+                    self.Listener.start()
 
     def ucondb(self):
-        meta_db = self.MetaConnPool.connect()
+        self.startListener()
         if self.DatsStoreType == 'couchbase':
             if self.DataStore is None:
                 self.DataStore = UCDCouchBaseDataStorage(self.CouchbaseURL,
@@ -96,11 +140,16 @@ class DBConnection(object):
             data_store = self.DataStore            
         else:
             #Postgres
-            data_db = self.DataConnPool.connect()
-            data_store = UCDPostgresDataStorage(data_db, default_namespace=self.DataNamespace)
-        return UConDB(meta_db, data_store, default_namespace=self.MetaNamespace)
+            if self.DataStore is None:
+                self.DataStore = UCDPostgresDataStorage(self.DataConnPool, default_namespace=self.DataNamespace, 
+                                        instrumentation=self.QueryStats)
+            data_store = self.DataStore
+        return UConDB(self.MetaConnPool, data_store, default_namespace=self.MetaNamespace, interval_index=self.IntervalIndex,
+                    notify_channel=self.NotifyChannel, replay_cache=self.ReplayCache, instrumentation=self.QueryStats)
 
     def disconnect(self):
+        if self.Listener is not None:
+            self.Listener.stop()
         self.DataConnPool.close()
         self.MetaConnPool.close()
 
@@ -191,6 +240,7 @@ class UConDBServerApp(WPApp):
             self.Passwords[f] = folder_dict
         """        
         self.ReadOnly = self.ServerConfig.get("read_only", False)
+        self.WriteLocks = KeyLocks()        # writes to the same object are serialized, reads run concurrently
 
     def init(self):
         tempdirs=[self.ScriptHome]
@@ -11,8 +11,9 @@ class UConDBUIHandler(WPHandler):
         namespace = namespace or self.App.DefaultNamespace or "public"
         db = self.App.db()
         folders = db.listFolders(namespace)
+        tag_counts = db.tagCounts(folders)
         for f in folders:
-            f.tags = len(f.listTags())
+            f.tags = tag_counts.get(f.Name, 0)
         return self.render_to_response("index.html", namespaces = db.listNamespaces(),
             namespace = namespace, folders = folders)
 
@@ -42,6 +43,7 @@ class UConDBUIHandler(WPHandler):
             url_head += "&begins_with=%s" % (urllib.parse.quote(begins_with),)
         page, prev_page_url, next_page_url = self.paginate(len(objects), page, url_head)
         objects = objects[:self.PAGE]
+        folder.loadLastVersions(objects)
 
         return self.render_to_response("folder.html", folder=folder,
             page = page, 
@@ -49,14 +51,12 @@ class UConDBUIHandler(WPHandler):
             objects = objects, begins_with=begins_with or "")
 
     @sanitize()
-    def object(self, request, relpath, folder=None, name=None, page=None,
+    def object(self, request, relpath, folder=None, name=None, page=None, after=None,
                     key=None, tv=None, tr=None, tag=None, **args):
+        # versions are paginated with page tokens ("after"), "page" is the page number used for display only
         db = self.App.db()
-        limit = 101
-        offset = 0
-        if page is not None:
-            page = int(page)
-            offset = self.PAGE*page
+        page = int(page or 0)
+        after = after or None
 
         # if the form method was "GET", all these values will be passed as "", not as None's
         tag = tag or None
@@ -69,6 +69,9 @@ class UConDBUIHandler(WPHandler):
         if key:  key = urllib.parse.unquote_plus(key)
 
         url_head = f"./object?folder={folder}&name={name}"
+        for arg_name, value in (("tag", tag), ("tv", tv), ("tr", tr)):
+            if value:
+                url_head += f"&{arg_name}=" + urllib.parse.quote_plus(value)
         folder = db.getFolder(folder)
         obj = folder.getObject(name)
 
@@ -91,13 +94,19 @@ class UConDBUIHandler(WPHandler):
                 tv = urllib.parse.unquote_plus(tr)
                 tr = datetime.strptime(tr, '%Y-%m-%d %H:%M:%S')
             
-            versions = list(obj.listVersions(offset=offset, limit=self.PAGE+1, tag=tag, tv=tv, tr=tr))
+            versions = list(obj.listVersions(after=after, limit=self.PAGE+1, tag=tag, tv=tv, tr=tr))
         
-            page, prev_page_url, next_page_url = self.paginate(len(versions), page, url_head)
-            versions = versions[:self.PAGE]
+            first_page_url = next_page_url = None
+            if page > 0:
+                first_page_url = url_head
+            if len(versions) > self.PAGE:
+                versions = versions[:self.PAGE]
+                next_page_url = url_head + "&page=%d&after=%s" % (page + 1, urllib.parse.quote(versions[-1].pageToken()))
+            if page == 0 and next_page_url is None:
+                page = None
         
             return self.render_to_response("object.html", versions = versions, object=obj, folder=folder,
-                prev_page_url = prev_page_url, next_page_url = next_page_url, page=page,
+                first_page_url = first_page_url, next_page_url = next_page_url, page=page,
                 tv=tv_orig, tr=tr_orig, tag=tag
             )
 
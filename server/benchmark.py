@@ -0,0 +1,54 @@
+from ucondb import UConDBClient
+from getopt import getopt
+from threading import Thread
+import sys, time, random
+
+Usage = """
+python benchmark.py [options] <server URL> <folder> <object> ...
+
+Measures read throughput of the server with increasing number of client threads
+
+options:
+    -t <n>,<n>,...  - numbers of client threads to try, default: 1,2,4,8,16
+    -n <n>          - number of requests per thread, default: 100
+    -d              - read data, default: metadata only
+"""
+
+class Client(Thread):
+
+    def __init__(self, url, folder, objects, n, meta_only):
+        Thread.__init__(self, daemon=True)
+        self.Client = UConDBClient(url, timeout=60)
+        self.Folder = folder
+        self.Objects = objects
+        self.N = n
+        self.MetaOnly = meta_only
+        self.Errors = 0
+
+    def run(self):
+        for _ in range(self.N):
+            try:    self.Client.get(self.Folder, random.choice(self.Objects), meta_only=self.MetaOnly)
+            except Exception:
+                self.Errors += 1
+
+opts, args = getopt(sys.argv[1:], "t:n:d")
+if len(args) < 3:
+    print(Usage)
+    sys.exit(2)
+
+opts = dict(opts)
+url, folder, objects = args[0], args[1], args[2:]
+thread_counts = [int(x) for x in opts.get("-t", "1,2,4,8,16").split(",")]
+n = int(opts.get("-n", 100))
+meta_only = "-d" not in opts
+
+print("%8s %10s %10s %8s" % ("threads", "requests", "req/sec", "errors"))
+for nthreads in thread_counts:
+    clients = [Client(url, folder, objects, n, meta_only) for _ in range(nthreads)]
+    t0 = time.time()
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+    dt = time.time() - t0
+    print("%8d %10d %10.1f %8d" % (nthreads, nthreads*n, nthreads*n/dt, sum(c.Errors for c in clients)))
@@ -1,4 +1,4 @@
-from webpie import WPHandler, app_synchronized, sanitize
+from webpie import WPHandler, sanitize
 from webpie import Response as BaseResponse
 from ucondb import UConDB, Signature, Version
 from UI import UConDBUIHandler
@@ -40,6 +40,40 @@ class FolderNotFoundError(Exception):
         
 class ParameterError(ValueError):
     pass
+
+class KeyLocks(object):
+    #
+    # Registry of locks by key, used to serialize writes to the same object within the server process
+    # Locks are created on demand and removed when no thread holds or waits for them
+    #
+
+    def __init__(self):
+        self.Lock = threading.Lock()
+        self.Locks = {}             # {key: [lock, number of users]}
+
+    class KeyLock(object):
+
+        def __init__(self, registry, key):
+            self.Registry = registry
+            self.Key = key
+
+        def __enter__(self):
+            with self.Registry.Lock:
+                entry = self.Registry.Locks.setdefault(self.Key, [threading.Lock(), 0])
+                entry[1] += 1
+            entry[0].acquire()
+            return self
+
+        def __exit__(self, *args):
+            with self.Registry.Lock:
+                entry = self.Registry.Locks[self.Key]
+                entry[0].release()
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.Registry.Locks[self.Key]
+
+    def __call__(self, *key):
+        return self.KeyLock(self, key)
     
 class Response(BaseResponse):
 
@@ -112,6 +146,16 @@ class UConDBHandler(WPHandler):
         except:
             return Response("Error: %s %s" % (sys.exc_info()[0], sys.exc_info()[1]))
 
+    def query_stats(self, req, relpath, reset="no", **args):
+        # per-query statistics collected if enabled in the server configuration
+        stats = self.App.DB.QueryStats
+        if stats is None:
+            return "Query statistics are not enabled", 404
+        report = stats.report()
+        if reset == "yes":
+            stats.reset()
+        return json.dumps(report, indent=1), "text/json"
+
     def hello(self, req, relpath, **args):
         return Response("hello: x=%s" % (req.GET.get('x'),))
         
@@ -126,6 +170,10 @@ class UConDBHandler(WPHandler):
             return self.App.ServerPassword if user == "*" else self.App.getPassword(folder, user)
 
         ok = Signature(folder, data).verify(authenticator, get_password)
+        if ok:
+            # reject replayed requests
+            salt = authenticator.split(":", 3)[2]
+            ok = self.App.DB.ReplayCache.check(folder, salt)
         return ok
         
     def parseArgs(self, relpath, args):
@@ -173,7 +221,6 @@ class UConDBHandler(WPHandler):
                 return False, resp
         return True, None
 
-    @app_synchronized
     def doPut(self, req, params):    
         if self.App.ReadOnly:
             return "Read-only instance", 405
@@ -195,7 +242,8 @@ class UConDBHandler(WPHandler):
         if isinstance(tags, str):
             tags = [tags]
         #print "Request body:", req.body
-        v = o.createVersion(req.body, tv, tags=tags, key=key, override_key=override)
+        with self.App.WriteLocks(folder.Name, object):
+            v = o.createVersion(req.body, tv, tags=tags, key=key, override_key=override)
         full_meta = params.get("full_meta", "no") == "yes"
         return (json.dumps(v.metadata), "text/json") if full_meta else str(v.ID)
 
@@ -208,7 +256,6 @@ class UConDBHandler(WPHandler):
         for i in range(0, len(data), chunk_size):
             yield data[i:i+chunk_size]  
         
-    @app_synchronized
     def doGet(self, req, params):
         folder = params.get("folder")
         object = params.get("object")
@@ -271,10 +318,27 @@ class UConDBHandler(WPHandler):
             
     @sanitize()
     def tag(self, req, relpath, tag=None, folder=None, key=None, object=None, version_id=None):
+        #
+        # bulk tagging: POST with request body as one of JSON dictionaries:
+        # { "ids":[list of version ids] }
+        # { "keys":[[object, key], ...] }
+        # { "tv":tv, "tr":tr, "objects":[object, ...] }, tr and objects are optional
+        # returns JSON list of ids of newly tagged versions
+        #
         if self.App.ReadOnly:
             return "Read-only instance", 405
         assert folder is not None
         assert tag is not None
+        if req.method.lower() == "post" and req.body:
+            f = self.App.db().getFolder(folder)
+            if f is None:
+                return f"Folder {folder} not found", 404
+            ok, resp = self.authenticate(req, f.Name)
+            if not ok:  return resp
+            specs = json.loads(req.body)
+            tagged = f.tagVersions(tag, ids=specs.get("ids"), keys=specs.get("keys"), tv=specs.get("tv"), 
+                        tr=specs.get("tr"), objects=specs.get("objects"))
+            return json.dumps(tagged), "text/json"
         if version_id is None:
             assert object is not None and key is not None
             o = self.App.db().getFolder(folder).getObject(object)
@@ -284,7 +348,8 @@ class UConDBHandler(WPHandler):
             version_id = int(version_id)
             folder = self.App.db().getFolder(folder)
             v = folder.getVersionByID(version_id)
-        v.addTag(tag)
+        with self.App.WriteLocks(v.Object.Folder.Name, v.Object.Name):
+            v.addTag(tag)
         return "OK"
             
     @sanitize()
@@ -367,7 +432,12 @@ class UConDBHandler(WPHandler):
         
         
     @sanitize()
-    def versions(self, req, relpath, folder=None, object=None, format="json", namespace="public", tv=None, tr=None, tr_since=None, **args):
+    def versions(self, req, relpath, folder=None, object=None, format="json", namespace="public", tv=None, tr=None, tr_since=None, 
+                limit=None, after=None, **args):
+        #
+        # if limit is specified, and there are more versions to return, the X-UConDB-next-page response header
+        # will contain the page token to be passed as "after" to get the next page
+        #
         if tv is None:  
             tv = time.time()
         else:
@@ -381,9 +451,19 @@ class UConDBHandler(WPHandler):
         o = f.getObject(object)
         if o is None:
             return 404, f"Object {object} not found"
-        versions = o.listVersions(tr=tr, tv=tv, tr_since=tr_since)
+        if limit is None:
+            versions = o.listVersions(tr=tr, tv=tv, tr_since=tr_since, after=after)
+            dicts = (json.dumps(v.as_jsonable()) for v in versions)
+            return stream_in_chunks(stream_as_json_list(dicts)), "text/json"
+
+        limit = int(limit)
+        versions = list(o.listVersions(tr=tr, tv=tv, tr_since=tr_since, after=after, limit=limit+1))
+        headers = {"Content-Type": "text/json"}
+        if len(versions) > limit:
+            versions = versions[:limit]
+            headers["X-UConDB-next-page"] = versions[-1].pageToken()
         dicts = (json.dumps(v.as_jsonable()) for v in versions)
-        return stream_in_chunks(stream_as_json_list(dicts)), "text/json"
+        return stream_in_chunks(stream_as_json_list(dicts)), headers
         
     COMPRESS_LIMIT = 10*1024        # do not try to compress short blobs
 
@@ -493,7 +573,8 @@ class UConDBHandler(WPHandler):
             if o is None:
                 raise ParameterError("Object name must be specified")
             if tr is not None:  tr = float(tr)
-            out = o.getVersionsByTvs(tvs, tag=tag, tr=tr)       # returns versions in the same order as tvs
+            # (tv, version) pairs sorted by tv, tvs without a version are omitted, see UCDObject.getVersionsByTvs
+            out = o.getVersionsByTvs(tvs, tag=tag, tr=tr)
         return out
 
     @sanitize()
@@ -537,11 +618,49 @@ class UConDBHandler(WPHandler):
             return f"Object {object_name} not found", 404
 
         if tvs is not None:
-            stream = (v.as_jsonable().update({"lookup_tv":tv}) for tv, v in versions)
+            stream = (v.set_lookup_tv(tv).as_jsonable() for tv, v in versions)
         else:
             stream = (v.as_jsonable() for v in versions)
         return stream_as_json_seq(stream), "text/json-seq"
         
+    @sanitize()
+    def resolve_versions(self, req, relpath, folder=None, tr=None, tag=None, **args):
+        #
+        # relpath can be either blank or "folder"
+        # request body is one of JSON dictionaries:
+        # { "lookups":[[object, tv], ...] }
+        # { "objects":[object, ...], "tv":tv }
+        #
+        assert req.method.lower() == "post"
+        specs = json.loads(req.body)
+        folder_name = relpath or folder
+        f = self.App.db().getFolder(folder_name)
+        if f is None:
+            return f"Folder {folder_name} not found", 404
+        if "lookups" in specs:
+            lookups = specs["lookups"]
+        else:
+            tv = float(specs.get("tv", time.time()))
+            lookups = [(o, tv) for o in specs.get("objects", [])]
+        if tr is not None:  tr = float(tr)
+        versions = f.resolveVersions(lookups, tag=tag, tr=tr)
+        stream = (v.set_lookup_tv(tv).as_jsonable() for _, tv, v in versions)
+        return stream_as_json_seq(stream), "text/json-seq"
+
+    @sanitize()
+    def latest_versions(self, req, relpath, folder=None, objects=None, **args):
+        #
+        # relpath can be either blank or "folder"
+        # objects: optional comma-separated list of object names
+        #
+        folder_name = relpath or folder
+        f = self.App.db().getFolder(folder_name)
+        if f is None:
+            return f"Folder {folder_name} not found", 404
+        names = [o for o in objects.split(",") if o] if objects else None
+        stream = (v.as_jsonable() for v in f.latestVersions(names))
+        return stream_as_json_seq(stream), "text/json-seq"
+
     @sanitize()
     def get_blob(self, req, relpath, folder=None, data_key=None, version_id=None, compress="no"):
         if (data_key is None) == (version_id is None):
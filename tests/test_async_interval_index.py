@@ -0,0 +1,40 @@
+import asyncio, pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("asyncpg")
+pytest.importorskip("wsdbtools")
+pytest.importorskip("pythreader")
+
+from datetime import datetime, timezone
+from ucondb.UConDB import UCDIntervalIndex, UCDIntervalIndexCache
+from ucondb.UConDB_async import AsyncUCDFolder, AsyncUCDObject
+
+class AsyncDB(object):
+    # stands for AsyncUConDB with the interval index enabled, answers the tags query
+
+    def __init__(self, tags):
+        self.IntervalIndex = UCDIntervalIndexCache()
+        self.Tags = tags
+        self.Queries = []
+
+    async def fetchval(self, table, sql, *args):
+        self.Queries.append((table, sql, args))
+        return self.Tags.get(args[0], [])
+
+def test_get_with_interval_index_loads_tags():
+    db = AsyncDB({2: ["prod", "v2"]})
+    folder = AsyncUCDFolder(db, "test.folder", {"versions", "tags"})
+    obj = AsyncUCDObject(folder, "obj")
+    tr = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    db.IntervalIndex.Indexes[(folder.Name, obj.Name)] = UCDIntervalIndex([
+        (1, tr, 10.0, "k1", 100, 1, None),
+        (2, tr, 20.0, "k2", 200, 2, "key2")
+    ])
+
+    v = asyncio.run(obj.getVersion(tv=25.0))
+
+    assert v.ID == 2
+    meta = v.metadata
+    assert meta["tags"] == ["prod", "v2"]
+    assert meta["key"] == "key2"
+    assert len(db.Queries) == 1
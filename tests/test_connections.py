@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from ucondb.UConDB import UConDB
+from ucondb.tools import namespace_cursor
+
+class RawConnection(object):
+    # stands for psycopg2 connection, records executed statements
+
+    autocommit = False
+
+    def __init__(self):
+        self.Executed = []
+
+    def cursor(self):
+        return Cursor(self)
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_IDLE
+
+class Cursor(object):
+
+    rowcount = 0
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, args=()):
+        self.connection.Executed.append(sql)
+
+    def fetchall(self):
+        return []
+
+class PooledConnection(object):
+    # new wrapper object for each connect(), as returned by connection pools
+
+    def __init__(self, raw):
+        self.Raw = raw
+
+    def cursor(self):
+        return self.Raw.cursor()
+
+    def __getattr__(self, name):
+        return getattr(self.Raw, name)
+
+def count(raw, prefix):
+    return sum(1 for sql in raw.Executed if sql.startswith(prefix))
+
+def test_namespace_set_once_per_physical_connection():
+    raw = RawConnection()
+    for _ in range(3):
+        namespace_cursor(PooledConnection(raw), "test_ns")
+    assert count(raw, "set schema") == 1
+
+def test_statements_prepared_once_per_physical_connection():
+    raw = RawConnection()
+    for _ in range(3):
+        db = UConDB(PooledConnection(raw), None, default_namespace="test_ns")
+        db.executePrepared("test_ns.folder", "count", "select count(*) from %t_versions")
+    assert count(raw, "select name from pg_prepared_statements") == 1
+    assert count(raw, "prepare ") == 1
+    assert count(raw, "execute ") == 3
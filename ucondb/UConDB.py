@@ -1,16 +1,42 @@
-import psycopg2, sys, time, zlib, hashlib, uuid, string
-from datetime import datetime
-from .tools import to_str, to_bytes, DbDig, epoch
-from base64 import b64encode
+import psycopg2, os, sys, time, zlib, hashlib, uuid, string, json, weakref, select, heapq
+from datetime import datetime, timezone
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from threading import RLock, Thread, local
+from .tools import to_str, to_bytes, DbDig, epoch, namespace_cursor, physical_connection
+from base64 import b64encode, urlsafe_b64encode, urlsafe_b64decode
 
 #import cStringIO
 
-def cursor_generator(c):
-    while True:
-        tup = c.fetchone()
-        if tup is None:
-            break
-        yield tup
+def page_token(tr, tv, vid):
+    return urlsafe_b64encode(json.dumps([tr.isoformat(), tv, vid]).encode("utf-8")).decode("utf-8")
+
+def parse_page_token(token):
+    # returns (tr, tv, id) tuple
+    try:
+        tr, tv, vid = json.loads(urlsafe_b64decode(token.encode("utf-8")))
+        return datetime.fromisoformat(tr), float(tv), int(vid)
+    except Exception:
+        raise ValueError("Invalid page token: %s" % (token,))
+
+# correlated sub-select of the sorted list of the version tags. Used in version queries to avoid one tags query per version.
+# The versions table must have alias "v"
+TagsColumn = "coalesce((select array_agg(tt.tag_name order by tt.tag_name) from %t_tags tt where tt.version_id = v.id), array[]::text[])"
+
+def cursor_generator(c, batch=1000):
+    # server-side cursors are "with hold" and stay open until closed, see UConDB.serverCursor
+    try:
+        while True:
+            tups = c.fetchmany(batch)
+            if not tups:
+                break
+            for tup in tups:
+                yield tup
+    finally:
+        if not c.closed:
+            try:    c.close()
+            except psycopg2.Error:
+                pass
 
 class UConDBException(Exception):
 
@@ -27,27 +53,449 @@ class KeyExistsException(UConDBException):
             existing_version.Key))
         self.ExistingVersion = existing_version
 
+class UCDIntervalIndex:
+    #
+    # In-memory index of all versions of one object, used to resolve Tv/Tr lookups without a DB round trip
+    #
+    # Entries are tuples (tv, tr_epoch, vid, tr, data_key, data_size, adler32, key)
+    # ByTv is sorted by (tv, tr_epoch, vid), Best[i] is the position in ByTv of the max (tr, tv) entry among ByTv[:i+1],
+    # which is what "order by tr desc, tv desc limit 1" returns for "tv <= x".
+    # ByTr is sorted by (tr_epoch, tv, vid) and is used for lookups with Tr cut-off
+    # add() and lookup() may be called by different threads concurrently and are serialized with the index lock
+    #
+
+    def __init__(self, rows=[]):
+        self.Lock = RLock()
+        entries = [(tv, epoch(tr), vid, tr, data_key, data_size, adler32, key) 
+                    for vid, tr, tv, data_key, data_size, adler32, key in rows]
+        self.ByTv = sorted(entries, key=self.tv_order)
+        self.TvKeys = [self.tv_order(e) for e in self.ByTv]
+        self.ByTr = sorted(entries, key=self.tr_order)
+        self.TrKeys = [self.tr_order(e) for e in self.ByTr]
+        self.Best = []
+        self.update_best(0)
+
+    @staticmethod
+    def tv_order(e):
+        return (e[0], e[1], e[2])
+
+    @staticmethod
+    def tr_order(e):
+        return (e[1], e[0], e[2])
+
+    def update_best(self, i):
+        del self.Best[i:]
+        best = self.Best[i-1] if i > 0 else None
+        for j in range(i, len(self.ByTv)):
+            if best is None or self.tr_order(self.ByTv[j]) >= self.tr_order(self.ByTv[best]):
+                best = j
+            self.Best.append(best)
+
+    def __len__(self):
+        return len(self.ByTv)
+
+    def add(self, vid, tr, tv, data_key, data_size, adler32, key=None):
+        e = (tv, epoch(tr), vid, tr, data_key, data_size, adler32, key)
+        with self.Lock:
+            if key is not None:
+                self.clearKey(key)
+            k = self.tv_order(e)
+            i = bisect_right(self.TvKeys, k)
+            self.ByTv.insert(i, e)
+            self.TvKeys.insert(i, k)
+            self.update_best(i)
+            k = self.tr_order(e)
+            j = bisect_right(self.TrKeys, k)
+            self.ByTr.insert(j, e)
+            self.TrKeys.insert(j, k)
+
+    def clearKey(self, key):
+        # the key was moved to another version by createVersion(override_key=True)
+        for lst in (self.ByTv, self.ByTr):
+            for i, e in enumerate(lst):
+                if e[7] == key:
+                    lst[i] = e[:7] + (None,)
+
+    def lookup(self, tv, tr=None):
+        # returns the entry tuple or None
+        if isinstance(tr, datetime):
+            tr = epoch(tr)
+        with self.Lock:
+            if tr is None:
+                i = bisect_right(self.TvKeys, (tv, float("inf")))
+                if i == 0:  return None
+                return self.ByTv[self.Best[i-1]]
+            j = bisect_left(self.TrKeys, (tr,))        # tr < cut-off
+            for k in range(j-1, -1, -1):
+                e = self.ByTr[k]
+                if e[0] <= tv:
+                    return e
+            return None
+
+class UCDIntervalIndexCache:
+    #
+    # Process-wide cache of UCDIntervalIndex objects, keyed by (folder name, object name)
+    # Pass an instance to UConDB to enable in-memory Tv/Tr resolution.
+    # The indexes are updated by createVersion running in the same process only. Versions created by other processes
+    # are seen only if the cache is invalidated by a UCDChangeListener, so the cache must not be used without one.
+    #
+
+    def __init__(self, max_objects=1000):
+        self.MaxObjects = max_objects
+        self.Indexes = OrderedDict()
+        # {(folder name, object name): [number of loading threads, list of add() arguments received during the load,
+        #   or None if the key was invalidated during the load]}
+        self.Loading = {}
+        self.Lock = RLock()
+
+    def get(self, obj):
+        k = (obj.Folder.Name, obj.Name)
+        with self.Lock:
+            index = self.Indexes.get(k)
+            if index is not None:
+                self.Indexes.move_to_end(k)
+                return index
+            pending = self.Loading.setdefault(k, [0, []])
+            pending[0] += 1
+        loaded = False
+        try:
+            index = UCDIntervalIndex(obj.loadIndexRows())
+            loaded = True
+        finally:
+            with self.Lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    del self.Loading[k]
+                if loaded:
+                    cached = self.Indexes.get(k)
+                    if cached is not None:
+                        index = cached
+                    elif pending[1] is not None:
+                        # versions added by this process during the load may be missing from the loaded rows.
+                        # An index invalidated during the load is used for this lookup only
+                        vids = set(e[2] for e in index.ByTv)
+                        for vid, tr, tv, data_key, data_size, adler32, key in pending[1]:
+                            if vid not in vids:
+                                index.add(vid, tr, tv, data_key, data_size, adler32, key=key)
+                        self.Indexes[k] = index
+                        while len(self.Indexes) > self.MaxObjects:
+                            self.Indexes.popitem(last=False)
+        return index
+
+    def cached(self, folder_name, object_name):
+        # returns the index if it is loaded, None otherwise
+        k = (folder_name, object_name)
+        with self.Lock:
+            index = self.Indexes.get(k)
+            if index is not None:
+                self.Indexes.move_to_end(k)
+            return index
+
+    def add(self, obj, vid, tr, tv, data_key, data_size, adler32, key=None):
+        # updates the index if it is already loaded or is being loaded
+        k = (obj.Folder.Name, obj.Name)
+        with self.Lock:
+            index = self.Indexes.get(k)
+            if index is not None:
+                index.add(vid, tr, tv, data_key, data_size, adler32, key=key)
+            pending = self.Loading.get(k)
+            if pending is not None and pending[1] is not None:
+                pending[1].append((vid, tr, tv, data_key, data_size, adler32, key))
+
+    def invalidate(self, folder_name=None, object_name=None):
+        with self.Lock:
+            if folder_name is None:
+                self.Indexes = OrderedDict()
+            elif object_name is not None:
+                self.Indexes.pop((folder_name, object_name), None)
+            else:
+                for k in [k for k in self.Indexes if k[0] == folder_name]:
+                    del self.Indexes[k]
+            for k, pending in self.Loading.items():
+                if folder_name is None or k[0] == folder_name and (object_name is None or k[1] == object_name):
+                    pending[1] = None
+
+class UCDFolderCache:
+    #
+    # Process-wide cache of folder tables, keyed by (database, fully qualified folder name)
+    # Values are sets of existing folder table suffixes ("versions", "tags", ...), empty set if the folder does not exist
+    # Non-existing folders are remembered for a shorter time so that folders created by other processes are found soon
+    #
+
+    def __init__(self, ttl=300, negative_ttl=10):
+        self.TTL = ttl
+        self.NegativeTTL = negative_ttl
+        self.Folders = {}           # {(db_key, fqname): (expiration time, frozenset of table suffixes)}
+        self.Lock = RLock()
+
+    def get(self, db_key, fqname):
+        # returns frozenset of table suffixes or None if not cached
+        with self.Lock:
+            tup = self.Folders.get((db_key, fqname))
+            if tup is None:
+                return None
+            expiration, tables = tup
+            if expiration < time.time():
+                del self.Folders[(db_key, fqname)]
+                return None
+            return tables
+
+    def put(self, db_key, fqname, tables):
+        tables = frozenset(tables)
+        ttl = self.TTL if tables else self.NegativeTTL
+        with self.Lock:
+            self.Folders[(db_key, fqname)] = (time.time() + ttl, tables)
+
+    def invalidate(self, db_key=None, fqname=None):
+        with self.Lock:
+            if db_key is None and fqname is None:
+                self.Folders = {}
+            else:
+                for k in [k for k in self.Folders 
+                            if (db_key is None or k[0] == db_key) and (fqname is None or k[1] == fqname)]:
+                    del self.Folders[k]
+
+class UCDSharedSalts:
+    #
+    # Replay protection store shared by several processes: one unlogged table in the metadata database
+    #
+
+    CreateTable = """
+        create unlogged table if not exists {table}
+        (
+            salt        text    primary key,
+            time_used   timestamp with time zone default current_timestamp
+        )"""
+
+    def __init__(self, db, table="ucondb_salts"):
+        self.DB = db
+        self.Table = table
+        self.Created = False
+
+    def add(self, key):
+        # returns True if the key was not there
+        c = self.DB.cursor()
+        if not self.Created:
+            c.execute(self.CreateTable.format(table=self.Table))
+            self.Created = True
+        c.execute(f"insert into {self.Table}(salt) values (%s) on conflict do nothing returning salt", (key,))
+        added = c.fetchone() is not None
+        c.execute("commit")
+        return added
+
+    def prune(self, ttl):
+        c = self.DB.cursor()
+        c.execute(f"delete from {self.Table} where time_used < now() - %s * interval '1 second'", (ttl,))
+        c.execute("commit")
+
+class UCDReplayCache:
+    #
+    # Process-wide store of recently used signature salts, used to reject replayed signed requests.
+    # Salts are time-based UUIDs (see Signature.generate). Salts older than TTL are rejected, so only the salts used
+    # within the last TTL seconds need to be remembered. Expired salts are pruned at most every prune_interval seconds.
+    # When max_size unexpired salts are remembered, new salts are rejected until some of them expire.
+    # If shared (UCDSharedSalts) is not None, the salts are also recorded there to detect replays sent to other processes.
+    #
+
+    UUIDEpoch = 0x01b21dd213814000          # 1970-01-01 in 100ns intervals since 1582-10-15, the uuid1 time origin
+
+    def __init__(self, ttl=600, skew=60, max_size=1000000, prune_interval=60, shared=None):
+        self.TTL = ttl
+        self.Skew = skew                    # allowed clock difference between the client and the server
+        self.MaxSize = max_size
+        self.PruneInterval = prune_interval
+        self.Shared = shared
+        self.Salts = {}                     # {(folder, salt): expiration time}
+        self.Expirations = []               # heap of (expiration time, (folder, salt))
+        self.LastPrune = time.time()
+        self.Lock = RLock()
+
+    def saltTime(self, salt):
+        # returns the creation time of a time-based UUID salt or None
+        try:    u = uuid.UUID(hex=salt)
+        except ValueError:
+            return None
+        if u.version != 1:
+            return None
+        return (u.time - self.UUIDEpoch)/1.0e7
+
+    def pruneExpired(self, now):
+        with self.Lock:
+            while self.Expirations and self.Expirations[0][0] < now:
+                _, k = heapq.heappop(self.Expirations)
+                del self.Salts[k]
+            self.LastPrune = now
+
+    def prune(self):
+        self.pruneExpired(time.time())
+        if self.Shared is not None:
+            self.Shared.prune(self.TTL + self.Skew)
+
+    def check(self, folder_name, salt):
+        # returns True and remembers the salt if it is fresh and was not used before
+        now = time.time()
+        t = self.saltTime(salt)
+        if t is None or t < now - self.TTL or t > now + self.Skew:
+            return False
+        key = (folder_name, salt)
+        with self.Lock:
+            if key in self.Salts:
+                return False
+            if len(self.Salts) >= self.MaxSize:
+                self.pruneExpired(now)
+                if len(self.Salts) >= self.MaxSize:
+                    # forgetting unexpired salts would allow their replay
+                    return False
+            expiration = t + self.TTL + self.Skew
+            self.Salts[key] = expiration
+            heapq.heappush(self.Expirations, (expiration, key))
+            prune = now > self.LastPrune + self.PruneInterval
+        if self.Shared is not None and not self.Shared.add(folder_name + ":" + salt):
+            return False
+        if prune:
+            self.prune()
+        return True
+
+class UCDChangeListener(Thread):
+    #
+    # Receives change notifications sent by UConDB instances in other processes and invalidates local caches.
+    # Callbacks added with addCallback() are called with the notification dictionary (see UConDB.notify),
+    # or with None when notifications may have been lost and all cached data must be discarded.
+    #
+
+    def __init__(self, conn_str, channel="ucondb_changes", interval_index=None, folder_cache=None, 
+                        default_namespace="public", retry_interval=10):
+        Thread.__init__(self, daemon=True)
+        self.ConnStr = conn_str
+        self.Channel = channel
+        self.IntervalIndex = interval_index
+        self.FolderCache = folder_cache
+        self.DefaultNamespace = default_namespace
+        self.RetryInterval = retry_interval
+        self.Callbacks = []
+        self.Stop = False
+
+    def addCallback(self, callback):
+        self.Callbacks.append(callback)
+
+    def invalidate(self, event):
+        if event is None:
+            if self.IntervalIndex is not None:  self.IntervalIndex.invalidate()
+            if self.FolderCache is not None:    self.FolderCache.invalidate()
+        else:
+            fqname = event.get("folder")
+            namespace, name = fqname.split(".", 1)
+            folder_names = [fqname, name] if namespace == self.DefaultNamespace else [fqname]
+            if event["event"] == "folder":
+                if self.FolderCache is not None:
+                    self.FolderCache.invalidate(fqname=fqname)
+                if self.IntervalIndex is not None:
+                    for folder_name in folder_names:
+                        self.IntervalIndex.invalidate(folder_name)
+            elif event["event"] == "version":
+                if self.IntervalIndex is not None:
+                    for folder_name in folder_names:
+                        self.IntervalIndex.invalidate(folder_name, event.get("object"))
+        for callback in self.Callbacks:
+            callback(event)
+
+    def run(self):
+        while not self.Stop:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.ConnStr)
+                conn.autocommit = True
+                conn.cursor().execute(f"listen {self.Channel}")
+                self.invalidate(None)           # changes made while not listening are unknown
+                while not self.Stop:
+                    if not select.select([conn], [], [], 5.0)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        try:    event = json.loads(n.payload)
+                        except ValueError:
+                            continue
+                        if event.get("origin") != UConDB.origin():
+                            self.invalidate(event)
+            except psycopg2.Error:
+                self.invalidate(None)
+                time.sleep(self.RetryInterval)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def stop(self):
+        self.Stop = True
+
 class UConDB:
-    def __init__(self, conn_or_str, data_storage, default_namespace="public"):
+
+    FolderCache = UCDFolderCache()          # default process-wide folder cache
+    ReplayCache = UCDReplayCache()          # default process-wide signature salts store, used by UCDFolder.checkSalt
+
+    #
+    # Change notifications
+    #
+    # If NotifyChannel is not None, folder creation, new versions and new tags are announced with Postgres
+    # notifications with JSON payload: 
+    #   {"origin": ..., "event": "folder"|"version"|"tag", "folder": fqname, "object": ..., "version_id": ..., "tag": ...}
+    # Notifications are sent within the writing transaction and are delivered to listeners (UCDChangeListener) when it commits.
+    #
+    NotifyChannel = None
+    Origin = None                           # (pid, uuid) identifying this process as the sender of notifications, see origin()
+
+    Instrumentation = None                  # query instrumentation hook, see tools/instrumentation.py
+
+    def __init__(self, conn_or_str, data_storage, default_namespace="public", interval_index=None, folder_cache=None,
+                notify_channel=None, replay_cache=None, instrumentation=None):
+        #
+        # conn_or_str: connection string, connection pool (object with connect() method) or connection
+        # With a connection string or a pool, each thread uses its own connection. A connection is shared by all threads.
+        #
         self.Conn = None
         self.ConnStr = None
+        self.ConnPool = None
         if isinstance(conn_or_str, str):
                 self.ConnStr = conn_or_str
+        elif hasattr(conn_or_str, "connect"):
+                self.ConnPool = conn_or_str
         else:
                 self.Conn = conn_or_str
+        self.Local = local()
         self.DataStorage = data_storage
         self.DefaultNamespace = default_namespace
+        self.IntervalIndex = interval_index         # UCDIntervalIndexCache or None
+        if folder_cache is not None:
+            self.FolderCache = folder_cache
+        if notify_channel is not None:
+            self.NotifyChannel = notify_channel
+        if replay_cache is not None:
+            self.ReplayCache = replay_cache
+        if instrumentation is not None:
+            self.Instrumentation = instrumentation
         
     def connect(self):
-        if self.Conn == None:
-            self.Conn = psycopg2.connect(self.ConnStr)
-        return self.Conn
+        if self.Conn is not None:
+            return self.Conn
+        conn = getattr(self.Local, "Conn", None)
+        if conn is None:
+            conn = self.Local.Conn = self.ConnPool.connect() if self.ConnPool is not None else psycopg2.connect(self.ConnStr)
+        return conn
     
     def cursor(self):
+        return namespace_cursor(self.connect(), self.DefaultNamespace)
+
+    ServerCursorBatch = 1000
+
+    def serverCursor(self):
+        # named (server-side) cursor. The results are fetched from the server in batches of ServerCursorBatch rows
+        # instead of being buffered on the client as a whole. Can execute only one statement.
+        # The cursor is declared "with hold" so that it survives commits done on the same per-thread connection
+        # while the results are iterated, e.g. by putData or UCDSharedSalts. It is closed by cursor_generator
         conn = self.connect()
-        c = conn.cursor()
-        if self.DefaultNamespace:
-            c.execute(f"set schema '{self.DefaultNamespace}'")
+        namespace_cursor(conn, self.DefaultNamespace)
+        c = conn.cursor(name="ucdb_" + uuid.uuid4().hex, withhold=True)
+        c.itersize = self.ServerCursorBatch
         return c
         
     def namespace_name(self, name):
@@ -56,18 +504,59 @@ class UConDB:
         else:
             return self.DefaultNamespace, name, self.DefaultNamespace + "." + name
             
-    def createFolder(self, name, owner=None, grants = {}, drop_existing=False):
+    def dbKey(self):
+        # identifies the database in process-wide caches
+        return self.ConnStr or getattr(self.connect(), "dsn", None)
+
+    def createFolder(self, name, owner=None, grants = {}, drop_existing=False, partitioning=None):
         namespace, name, fqname = self.namespace_name(name)
         self.DataStorage.createFolder(fqname, owner, grants, drop_existing=drop_existing)
-        f = UCDFolder.create(self, fqname, owner, grants, drop_existing)
+        f = UCDFolder.create(self, fqname, owner, grants, drop_existing, partitioning=partitioning)
+        self.FolderCache.invalidate(self.dbKey(), fqname)
+        if self.IntervalIndex is not None:
+            self.IntervalIndex.invalidate(fqname)
+        if self.NotifyChannel is not None:
+            self.notify("folder", fqname)
+            self.cursor().execute("commit")
         return f
 
+    @staticmethod
+    def origin():
+        # generated on first use in each process, so that workers forked after the module was imported differ
+        pid = os.getpid()
+        if UConDB.Origin is None or UConDB.Origin[0] != pid:
+            UConDB.Origin = (pid, uuid.uuid4().hex)
+        return UConDB.Origin[1]
+
+    def notify(self, event, folder, object=None, version_id=None, tag=None):
+        self.notifyMany(event, folder, [(object, version_id)], tag=tag)
+
+    def notifyMany(self, event, folder, items, tag=None):
+        # items: list of (object name, version id) pairs, one notification per pair
+        if self.NotifyChannel is None or not items:
+            return
+        fqname = self.namespace_name(folder)[2]
+        payloads = [json.dumps({"origin": self.origin(), "event": event, "folder": fqname, 
+                            "object": name, "version_id": vid, "tag": tag})
+                    for name, vid in items]
+        self.cursor().execute("select count(pg_notify(%s, p)) from unnest(%s::text[]) p", (self.NotifyChannel, payloads))
+
+    def folderTables(self, fqname):
+        # returns frozenset of existing folder table suffixes, using the folder cache
+        db_key = self.dbKey()
+        tables = self.FolderCache.get(db_key, fqname)
+        if tables is None:
+            tables = UCDFolder.tables(self.connect(), fqname)
+            self.FolderCache.put(db_key, fqname, tables)
+        return tables
+
     def getFolder(self, name):
         UCDFolder.validate_name(name)
         namespace, name, fqname = self.namespace_name(name)
-        if not UCDFolder.exists(self.connect(), fqname):
+        tables = self.folderTables(fqname)
+        if not "versions" in tables:
             return None
-        return UCDFolder(self, fqname)
+        return UCDFolder(self, fqname, tables)
 
     VColumns = ["id","object","tv","tv_end","tr","deleted","data_key", "key", "adler32", "data_size"]
     VColumns.sort()
@@ -80,43 +569,155 @@ class UConDB:
         return sorted(dbd.nspaces())
 
     def listFolders(self, namespace):
-        dbd = DbDig(self.connect())
-        tables = dbd.tables(namespace)
+        #
+        # finds all folders in the namespace with single catalog query
+        # a folder is a pair of <name>_versions and <name>_tags tables having at least VColumns and TColumns columns
+        #
+        c = self.connect().cursor()
+        c.execute("""
+            with folders as (
+                select v.relnamespace as nsoid, v.oid as void, substr(v.relname, 1, length(v.relname) - 9) as name
+                    from pg_class v, pg_namespace n
+                    where n.oid = v.relnamespace and n.nspname = %s
+                        and v.relkind in ('r', 'p') and v.relname like '%%\\_versions'
+            )
+            select f.name, 
+                    -- same names as UCDFolder.relation_name
+                    array(select s from unnest(%s::text[]) s, pg_class c
+                            where c.relnamespace = f.nsoid and c.relkind in ('r', 'p', 'i', 'I')
+                                and c.relname = case when length(f.name || '_' || s) > 63 and s like '%%\_backfill'
+                                                    then 'ucondb_bf_' || md5(f.name || '_' || s)
+                                                    else f.name || '_' || s end
+                    )
+                from folders f, pg_class t
+                where t.relnamespace = f.nsoid and t.relname = f.name || '_tags' and t.relkind in ('r', 'p')
+                    and array(select a.attname::text from pg_attribute a 
+                                where a.attrelid = f.void and a.attnum > 0 and not a.attisdropped) @> %s::text[]
+                    and array(select a.attname::text from pg_attribute a 
+                                where a.attrelid = t.oid and a.attnum > 0 and not a.attisdropped) @> %s::text[]
+                order by f.name""", (namespace, UCDFolder.TableSuffixes, self.VColumns, self.TColumns))
         ns = "" if namespace == self.DefaultNamespace else namespace + "."
-        #print tables
-        tables.sort()
+        db_key = self.dbKey()
         folders = []
-        for t in tables:
-            words = t.rsplit("_",1)
-            fn = words[0]
-            if len(words) == 2 and words[-1] == "_versions":
-                if not fn+"_tags" in tables: continue
-            v_columns = [c[0] for c in dbd.columns(namespace, t)]
-            v_columns.sort()
-            #print v_columns
-            if v_columns != self.VColumns:  continue
-            t_columns = [c[0] for c in dbd.columns(namespace, fn+"_tags")]
-            t_columns.sort()
-            if t_columns != self.TColumns:  continue
-            
-            folders.append(ns + fn)
-        return [UCDFolder(self, fn) for fn in folders]
+        for name, tables in c.fetchall():
+            self.FolderCache.put(db_key, namespace + "." + name, tables)
+            folders.append(UCDFolder(self, ns + name, set(tables)))
+        return folders
 
-    def execute(self, table, sql, args=()):
+    def tagCounts(self, folders):
+        # returns {folder name: number of version tags} for list of UCDFolder objects, with single query
+        if not folders:
+            return {}
+        sql = " union all ".join("select %%s, count(*) from %s_tags" % (f.Name,) for f in folders)
+        c = self.cursor()
+        c.execute(sql, [f.Name for f in folders])
+        return dict(c.fetchall())
+
+    def execute(self, table, sql, args=(), server_side=False):
+        # server_side=True: use named server-side cursor, read the results with cursor_generator()
         #print ("DB.execute(%s, %s, %s)" % (table, sql, args))
         namespace, table_no_ns, fqname = self.namespace_name(table)
+        template = sql
         sql = sql.replace('%t', table)
         sql = sql.replace('%T', table_no_ns)
-        c = self.cursor()
+        c = self.serverCursor() if server_side else self.cursor()
         #print ("executing: <%s>, %s" % (sql, args))
         t0 = time.time()
         c.execute(sql, args)
         #print "executed. t=%s" % (time.time() - t0,)
+        if self.Instrumentation is not None:
+            # rows of server side cursors are not known until they are fetched
+            self.Instrumentation("sql", template, table, args, time.time() - t0, None if server_side else c.rowcount, None)
+        return c
+
+    #
+    # Prepared statements
+    #
+    # PreparedStatements: {(table, query_id): (statement name, SQL text with $n parameters)}, shared by all UConDB instances
+    # PreparedOnConnection: {physical connection: set of statement names already prepared on the connection}
+    #
+    PreparedStatements = {}
+    PreparedOnConnection = weakref.WeakKeyDictionary()
+    PreparedLock = RLock()
+
+    @staticmethod
+    def dollar_parameters(sql):
+        # converts psycopg2 style "%s" parameters to "$1", "$2", ... and returns (sql, number of parameters)
+        parts = sql.split("%%")
+        n = 0
+        for i, part in enumerate(parts):
+            words = part.split("%s")
+            out = words[0]
+            for w in words[1:]:
+                n += 1
+                out += "$%d" % (n,) + w
+            parts[i] = out
+        return "%".join(parts), n
+
+    def preparedStatement(self, table, query_id, sql):
+        k = (table, query_id)
+        with self.PreparedLock:
+            stmt = self.PreparedStatements.get(k)
+            if stmt is None:
+                namespace, table_no_ns, fqname = self.namespace_name(table)
+                sql = sql.replace('%t', table)
+                sql = sql.replace('%T', table_no_ns)
+                name = "ucdb_" + hashlib.md5(f"{table}:{query_id}:{sql}".encode("utf-8")).hexdigest()[:24]
+                sql, nparams = self.dollar_parameters(sql)
+                stmt = self.PreparedStatements[k] = (name, sql, nparams)
+        return stmt
+
+    def preparedOnConnection(self, conn, c):
+        # returns set of names of statements prepared on the connection or None if the connection can not be tracked
+        conn = physical_connection(conn, c)
+        with self.PreparedLock:
+            try:    prepared = self.PreparedOnConnection.get(conn)
+            except TypeError:
+                return None         # not weak-referenceable
+            if prepared is None:
+                # the connection may have been used by another UConDB instance
+                c.execute("select name from pg_prepared_statements")
+                prepared = self.PreparedOnConnection[conn] = set(name for (name,) in c.fetchall())
+        return prepared
+
+    def executePrepared(self, table, query_id, sql, args=()):
+        # same as execute(), but the statement is prepared once per connection and then executed with EXECUTE
+        # query_id identifies the SQL text within the table
+        # all values must be passed as parameters, and their types must be derivable by Postgres from the statement
+        name, prepared_sql, nparams = self.preparedStatement(table, query_id, sql)
+        c = self.cursor()
+        prepared = self.preparedOnConnection(self.connect(), c)
+        if prepared is None:
+            return self.execute(table, sql, args)
+        if not name in prepared:
+            c.execute(f"prepare {name} as {prepared_sql}")
+            with self.PreparedLock:
+                prepared.add(name)
+        t0 = time.time()
+        if nparams:
+            c.execute(f"execute {name}(" + ",".join(["%s"]*nparams) + ")", args)
+        else:
+            c.execute(f"execute {name}")
+        if self.Instrumentation is not None:
+            self.Instrumentation("prepared", query_id, table, args, time.time() - t0, c.rowcount, None)
         return c
 
+    def fusedWrites(self):
+        # True if the data storage keeps the blobs in the metadata database, so that a version and its blob can be
+        # written in one transaction
+        same_database = getattr(self.DataStorage, "sameDatabase", None)
+        return same_database is not None and same_database(self.connect())
+
     def disconnect(self):
-        if self.Conn:   self.Conn.close()
-        self.Conn = None
+        # closes the connection used by the calling thread, connections taken from a pool are returned to the pool
+        conn = getattr(self.Local, "Conn", None)
+        if conn is not None:
+            self.Local.Conn = None
+            if self.ConnPool is None:
+                conn.close()
+        elif self.Conn is not None:
+            self.Conn.close()
+            self.Conn = None
 
 
 class UCDFolder:
@@ -140,6 +741,15 @@ create index %T_versions_inx on %t_versions (object, tv, tr);
 
 create unique index %T_object_key_inx on %t_versions (object, key);
 
+create index %T_versions_tv_end_inx on %t_versions (object, (coalesce(tv_end, 'infinity'::float)))
+    where tv_end is null or tv_end > tv;
+
+create index %T_versions_object_tr_inx on %t_versions (object, tr);
+
+create index %T_versions_page_inx on %t_versions (object, tr desc, tv, id);
+
+create index %T_versions_tr_brin on %t_versions using brin (tr);
+
 create table %t_tags
 (
     version_id int  references %t_versions(id) on delete cascade,
@@ -147,27 +757,125 @@ create table %t_tags
     primary key (version_id, tag_name)
 );
 
-create table %t_salt
+create index %T_tags_name_inx on %t_tags (tag_name, version_id);
+""" 
+
+    # objects catalog, maintained by createVersion. latest_tr, latest_tv are Tr and Tv of the last created version
+    CreateObjectsTable = """
+create table %t_objects
 (
-    salt        text    primary key,
-    time_used   timestamp with time zone default current_timestamp
+    name            text    primary key,
+    version_count   bigint  default 0,
+    latest_tr       timestamp with time zone,
+    latest_tv       float,
+    data_size       bigint  default 0
 );
 """
 
+    # latest version of each object in "tr desc, tv desc, id desc" order, maintained by createVersion
+    CreateLatestTable = """
+create table %t_latest
+(
+    object          text    primary key,
+    version_id      int     references %t_versions(id) on delete cascade,
+    tr              timestamp with time zone,
+    tv              float
+);
+"""
+
+    CreateTables = CreateTables + CreateObjectsTable + CreateLatestTable
+
+    #
+    # Partitioned folders: the versions table is partitioned by tr range ("tr:month", "tr:year") or by object hash
+    # ("object:<number of partitions>"). Foreign keys can not reference a partitioned table, so the tags and latest
+    # tables have none. The (object, key) unique index must include the partition key, so with tr range partitioning
+    # the key uniqueness is enforced by createVersion under the object lock instead.
+    # Range partitions are created ahead of time by addPartitions(), the versions with tr beyond the last one go 
+    # to the default partition.
+    # The partitioning specification is stored as the comment on the versions table.
+    #
+    VersionColumns = "id, key, object, tv, tv_end, tr, deleted, data_size, data_key, adler32"
+
+    CreatePartitionedVersions = """
+create table %t_versions{suffix}
+(   
+    id          integer not null default nextval('%t_versions_id_seq'),
+    key         text    null,
+    object      text    not null,
+    tv          float,
+    tv_end      float default null,
+    tr          timestamp with time zone not null default current_timestamp,
+    deleted     boolean default 'false',
+    data_size   bigint,
+    data_key    text,
+    adler32     bigint,
+    primary key (id, {column})
+) partition by {method} ({column});
+
+create index %T_versions{suffix}_inx on %t_versions{suffix} (object, tv, tr);
+
+create {unique} index %T_object_key{suffix}_inx on %t_versions{suffix} (object, key);
+
+create index %T_versions{suffix}_object_tr_inx on %t_versions{suffix} (object, tr);
+
+create index %T_versions{suffix}_page_inx on %t_versions{suffix} (object, tr desc, tv, id);
+
+create index %T_versions{suffix}_tr_brin on %t_versions{suffix} using brin (tr);
+
+comment on table %t_versions{suffix} is '{comment}';
+"""
+
+    CreatePartitionedValidityIndex = """
+create index %T_versions{suffix}_tv_end_inx on %t_versions{suffix} (object, (coalesce(tv_end, 'infinity'::float)))
+    where tv_end is null or tv_end > tv;
+"""
+
+    CreatePartitionedTables = """
+create table %t_tags
+(
+    version_id int,
+    tag_name    text,
+    primary key (version_id, tag_name)
+);
+
+create index %T_tags_name_inx on %t_tags (tag_name, version_id);
+""" + CreateObjectsTable + CreateLatestTable.replace("references %t_versions(id) on delete cascade", "")
+
+    PartitioningComment = "ucondb partitioning: "
+
 
     DropTables = """
         drop table %t_tags;
+        drop table if exists %t_latest;
         drop table %t_versions;
-        drop table %t_salt;
+        drop table if exists %t_salt;
+        drop table if exists %t_objects;
     """
 
     NameSafe = string.ascii_letters + string.digits + '._'
 
-    def __init__(self, db, name):
+    #
+    # Validity intervals: a version is effective for Tv in [tv, tv_end), tv_end is null for open-ended interval.
+    # Versions superseded for all Tvs have tv_end = tv. The intervals are maintained only if the folder
+    # has the versions_tv_end_inx index, created either by createTables or by createValidityIndex.
+    #
+    ValidityIndex = "versions_tv_end_inx"
+    ValidityIndexDefinition = "(object, (coalesce(tv_end, 'infinity'::float))) where tv_end is null or tv_end > tv"
+
+    RangePartition = "versions_default"     # exists if the versions table is partitioned by tr range
+
+    # tables built for existing folders by online migrations, see buildOnline
+    Backfilled = ["objects", "latest", ValidityIndex]
+
+    TableSuffixes = ["versions", "tags", "objects", "latest", ValidityIndex, RangePartition] + \
+                    [suffix + "_backfill" for suffix in Backfilled]
+
+    def __init__(self, db, name, tables=None):
         self.validate_name(name)
         self.Name = name
         self.DB = db
         self.DataInterface = self.DB.DataStorage
+        self.Tables = tables        # set of existing table suffixes, if known
         
     def __str__(self):
         return "UCDFolder(%s)" % (self.Name,)
@@ -182,49 +890,84 @@ create table %t_salt
             raise ValueError("syntax error in forlder name" % (name,))
 
     @staticmethod
-    def exists(db, fqname):
-        dbd = DbDig(db)
+    def relation_name(name, suffix):
+        # name of the folder table or index without the namespace. Postgres truncates names longer than 63 characters,
+        # so the backfill marker tables of long folder names are named by hash
+        relname = f"{name}_{suffix}"
+        if len(relname) > 63 and suffix.endswith("_backfill"):
+            relname = "ucondb_bf_" + hashlib.md5(relname.encode("utf-8")).hexdigest()
+        return relname
+
+    @staticmethod
+    def relation_names(name):
+        # {relation name: suffix} for all folder table suffixes
+        return {UCDFolder.relation_name(name, suffix): suffix for suffix in UCDFolder.TableSuffixes}
+
+    @staticmethod
+    def tables(db, fqname):
+        # returns set of suffixes of existing folder tables
         namespace, name = fqname.split(".", 1)
-        tables = dbd.tables(namespace)
-        return f"{name}_versions" in tables
+        relnames = UCDFolder.relation_names(name)
+        c = db.cursor()
+        c.execute("""select c.relname from pg_class c, pg_namespace n
+                        where n.oid = c.relnamespace and n.nspname = %s and c.relkind in ('r', 'p', 'i', 'I')
+                            and c.relname = any(%s)""", 
+                (namespace, list(relnames)))
+        return set(relnames[relname] for (relname,) in c.fetchall())
+
+    @staticmethod
+    def exists(db, fqname):
+        return "versions" in UCDFolder.tables(db, fqname)
+
+    def hasTable(self, suffix):
+        if self.Tables is None:
+            self.Tables = self.DB.folderTables(self.DB.namespace_name(self.Name)[2])
+        return suffix in self.Tables
+
+    def maintained(self, suffix):
+        # used by writers: True if the table has to be updated, i.e. it exists or is being built by an online migration
+        return self.hasTable(suffix) or self.hasTable(suffix + "_backfill")
+
+    def ready(self, suffix):
+        # used by readers: True if the table exists and is complete
+        return self.hasTable(suffix) and not self.hasTable(suffix + "_backfill")
+
+    def tablesChanged(self):
+        # commits the transaction which created or dropped folder tables and tells other processes to re-read them
+        fqname = self.DB.namespace_name(self.Name)[2]
+        self.DB.notify("folder", fqname)
+        self.execute("commit")
+        self.DB.FolderCache.invalidate(fqname=fqname)
+        self.Tables = None
 
     def dataInterface(self):
         return self.DataInterface
 
-    def execute(self, sql, args=()):
+    def execute(self, sql, args=(), server_side=False):
         #print("Folder.execute: Name:", self.Name, "sql, args:", (sql, args))
-        return self.DB.execute(self.Name, sql, args)
+        return self.DB.execute(self.Name, sql, args, server_side=server_side)
+
+    def executePrepared(self, query_id, sql, args=()):
+        return self.DB.executePrepared(self.Name, query_id, sql, args)
 
     @staticmethod
-    def create(db, name, owner, grants = {}, drop_existing=False):
+    def create(db, name, owner, grants = {}, drop_existing=False, partitioning=None):
         t = UCDFolder(db, name)
-        t.createTables(owner, grants, drop_existing)
+        t.createTables(owner, grants, drop_existing, partitioning=partitioning)
         return t
 
     def checkSalt(self, salt):
-        exists = False
-        try:    
-            c = self.execute("""select salt, time_used from %t_salt
-                    where salt = %s""", (salt,))
-            if c.fetchone():
-                return False
-        except:
-            # in case the table does not exist yet
-            c = self.execute("""rollback; create table %t_salt
-                            (
-                                salt        text    primary key,
-                                time_used   timestamp with time zone default current_timestamp
-                            )""")
-        self.execute("""insert into %t_salt(salt) values (%s); commit""", (salt,))
-        return True
+        # returns True if the signature salt was not used recently, see UCDReplayCache
+        return self.DB.ReplayCache.check(self.Name, salt)
             
     def tableNames(self):
         #return [self.Name + "_" + s for s in ("snapshot", "tag", "tag_snapshot", 
         #            "snapshot_data", "update")]
 
-        return [self.Name + "_" + s for s in ("versions", "tags", "salt")]
+        return [self.Name + "_" + s for s in ("versions", "tags")]
 
-    def createTables(self, owner = None, grants = {}, drop_existing=False):
+    def createTables(self, owner = None, grants = {}, drop_existing=False, partitioning=None):
+        # partitioning: None or partitioning specification, see parse_partitioning()
         exists = True
         c = self.DB.cursor()
         try:    
@@ -240,21 +983,470 @@ create table %t_salt
             c = self.DB.cursor()
             if owner:
                 c.execute("set role %s" % (owner,))
-            sql = self.CreateTables.replace('%t', self.Name)
-            self.execute(sql)
+            if partitioning:
+                self.parse_partitioning(partitioning)
+                self.execute("create sequence %t_versions_id_seq")
+                self.createPartitionedVersions(partitioning)
+                self.execute("alter sequence %t_versions_id_seq owned by %t_versions.id")
+                self.execute(self.CreatePartitionedTables)
+            else:
+                sql = self.CreateTables.replace('%t', self.Name)
+                self.execute(sql)
             read_roles = ','.join(grants.get('r',[]))
             if read_roles:
-                grant_sql = """grant select on %t_versions, %t_tags, %t_versions_id_seq to """ + read_roles         # + %t_snapshot_data,
+                grant_sql = """grant select on %t_versions, %t_tags, %t_objects, %t_latest, %t_versions_id_seq to """ + read_roles         # + %t_snapshot_data,
                 #print grant_sql
                 self.execute(grant_sql)
             write_roles = ','.join(grants.get('w',[]))
             if write_roles:
-                grant_sql = """grant insert, delete, update on %%t_versions, %%t_tags to %(roles)s; 
+                grant_sql = """grant insert, delete, update on %%t_versions, %%t_tags, %%t_objects, %%t_latest to %(roles)s; 
                     grant all on %%t_versions_id_seq to %(roles)s;""" % {'roles':write_roles}     # +%%t_snapshot_data,
                 # grant_sql
                 self.execute(grant_sql)
             c.execute("commit")
 
+    def buildOnline(self, suffix, create_sql, rebuild, grants={}, batch_size=1000, progress=None, finish=None):
+        #
+        # Online migration of an existing folder, which creates table <folder>_<suffix> and fills it from the versions table:
+        #   1. create the table and the marker table <folder>_<suffix>_backfill (see relation_name). Writers update the table from now on
+        #      (see maintained), readers ignore it while the marker exists (see ready). The exclusive folder lock waits
+        #      for the writers which may have looked up the folder tables before they were created
+        #   2. call rebuild(names) for batches of objects, each batch under the objects locks, so that versions
+        #      created concurrently are neither missed nor counted twice. The last processed object is recorded
+        #      in the marker table and an interrupted migration continues from there
+        #   3. call finish(), if given, and drop the marker table
+        # progress: callable(phase, done, total), phases: "backfill", "done"
+        #
+        namespace, name, fqname = self.DB.namespace_name(self.Name)
+        marker = namespace + "." + self.relation_name(name, suffix + "_backfill")
+        self.execute("begin")
+        self.execute("select pg_advisory_xact_lock(hashtext(%s))", (fqname,))
+        self.execute(f"create table if not exists {marker} (last_object text)")
+        if create_sql:
+            self.execute(create_sql)
+            read_roles = ','.join(grants.get('r',[]))
+            if read_roles:
+                self.execute(f"grant select on %t_{suffix} to " + read_roles)
+            write_roles = ','.join(grants.get('w',[]))
+            if write_roles:
+                self.execute(f"grant insert, delete, update on %t_{suffix} to " + write_roles)
+        self.tablesChanged()
+
+        c = self.execute(f"select max(last_object) from {marker}")
+        last = c.fetchone()[0] or ""
+        self.execute("commit")
+        done = 0
+        while True:
+            c = self.execute("""select distinct object from %t_versions 
+                                    where object > %s 
+                                    order by object limit %s""", (last, batch_size))
+            names = [name for (name,) in c.fetchall()]
+            if not names:
+                self.execute("commit")
+                break
+            self.lockObjects(names)
+            rebuild(names)
+            last = names[-1]
+            self.execute(f"delete from {marker}; insert into {marker}(last_object) values (%s)", (last,))
+            self.execute("commit")
+            done += len(names)
+            if progress is not None:
+                progress("backfill", done, None)
+
+        if finish is not None:
+            finish()
+        self.execute("begin")
+        self.execute(f"drop table {marker}")
+        self.tablesChanged()
+        if progress is not None:
+            progress("done", done, done)
+
+    def createObjectsCatalog(self, grants = {}, batch_size=1000, progress=None):
+        #
+        # online migration for folders created before the objects catalog was introduced:
+        # creates the objects table if needed and (re)builds it from the versions table, see buildOnline
+        #
+        def rebuild(names):
+            self.execute("""
+                delete from %t_objects where name = any(%s);
+                insert into %t_objects(name, version_count, latest_tr, latest_tv, data_size)
+                    select distinct on (object) object, 
+                            count(*) over (partition by object), tr, tv, 
+                            sum(data_size) over (partition by object)
+                        from %t_versions
+                        where not deleted and object = any(%s)
+                        order by object, tr desc, tv desc""", (names, names))
+
+        self.buildOnline("objects", self.CreateObjectsTable.replace("create table", "create table if not exists"), rebuild,
+                    grants, batch_size, progress)
+
+    # upsert of the objects catalog from {source} with columns (name, tr, tv, size), one row per new version
+    ObjectsUpsert = """
+            insert into %t_objects as o(name, version_count, latest_tr, latest_tv, data_size)
+                select name, count(*), max(tr), 
+                        (array_agg(tv order by tr desc, tv desc))[1],
+                        sum(size)
+                    from {source}
+                    group by name
+            on conflict (name) do update
+                set version_count = o.version_count + excluded.version_count,
+                    data_size = o.data_size + excluded.data_size,
+                    latest_tv = case when o.latest_tr is null or (excluded.latest_tr, excluded.latest_tv) >= (o.latest_tr, o.latest_tv) 
+                                    then excluded.latest_tv else o.latest_tv end,
+                    latest_tr = greatest(o.latest_tr, excluded.latest_tr)"""
+
+    def updateObjectsCatalog(self, names, trs, tvs, sizes):
+        # called by createVersion and createVersions within their transactions, for each created version
+        if not self.maintained("objects"):
+            return
+        self.execute(self.ObjectsUpsert.format(source="unnest(%s::text[], %s::timestamptz[], %s::float[], %s::bigint[]) as v(name, tr, tv, size)"),
+            (names, trs, tvs, sizes))
+
+    def createLatestTable(self, grants = {}, batch_size=1000, progress=None):
+        #
+        # online migration for folders created before the latest versions table was introduced, see buildOnline
+        #
+        def rebuild(names):
+            self.execute("""
+                delete from %t_latest where object = any(%s);
+                insert into %t_latest(object, version_id, tr, tv)
+                    select distinct on (object) object, id, tr, tv
+                        from %t_versions
+                        where not deleted and object = any(%s)
+                        order by object, tr desc, tv desc, id desc""", (names, names))
+
+        create_sql = self.CreateLatestTable.replace("create table", "create table if not exists")
+        if self.partitioning() is not None:
+            # foreign keys can not reference partitioned versions table
+            create_sql = create_sql.replace("references %t_versions(id) on delete cascade", "")
+        self.buildOnline("latest", create_sql, rebuild, grants, batch_size, progress)
+
+    # upsert of the latest versions table from {source} with columns (object, id, tr, tv), one row per new version
+    LatestUpsert = """
+            insert into %t_latest as l(object, version_id, tr, tv)
+                select distinct on (object) object, id, tr, tv
+                    from {source}
+                    order by object, tr desc, tv desc, id desc
+            on conflict (object) do update
+                set version_id = excluded.version_id, tr = excluded.tr, tv = excluded.tv
+                where (excluded.tr, excluded.tv, excluded.version_id) > (l.tr, l.tv, l.version_id)"""
+
+    def updateLatest(self, names, vids, trs, tvs):
+        # called by createVersion and createVersions within their transactions, for each created version
+        if not self.maintained("latest"):
+            return
+        self.execute(self.LatestUpsert.format(source="unnest(%s::text[], %s::int[], %s::timestamptz[], %s::float[]) as v(object, id, tr, tv)"), 
+            (names, vids, trs, tvs))
+
+    def latestVersions(self, names=None):
+        #
+        # generator of latest versions (the last in "tr desc, tv desc" order) of all objects or of the named objects,
+        # sorted by object name
+        #
+        if self.ready("latest"):
+            sql = f"""select v.object, v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                    from %t_latest l, %t_versions v
+                    where v.id = l.version_id
+                        and (%s::text[] is null or l.object = any(%s::text[]))
+                    order by l.object"""
+        else:
+            sql = f"""select v.object, v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                    from (
+                        select distinct on (object) * from %t_versions
+                            where not deleted and (%s::text[] is null or object = any(%s::text[]))
+                            order by object, tr desc, tv desc, id desc
+                    ) v
+                    order by v.object"""
+        c = self.execute(sql, (names, names), server_side=True)
+        for name, vid, tr, tv, data_key, data_size, key, adler32, tags in cursor_generator(c):
+            yield UCDVersion(UCDObject(self, name), vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
+
+    def loadLastVersions(self, objects):
+        # sets LastVersion for the list of UCDObjects with single query
+        by_name = {o.Name: o for o in objects}
+        if not by_name:
+            return
+        now = time.time()
+        for v in self.latestVersions(list(by_name.keys())):
+            if v.Tv <= now:
+                # otherwise the latest version is not effective yet and LastVersion will be looked up on demand
+                o = by_name[v.Object.Name]
+                v.Object = o
+                o._LastVersion = v
+
+    def lockObjects(self, names):
+        # serializes updates of the objects versions until the end of the transaction
+        fqname = self.DB.namespace_name(self.Name)[2]
+        self.execute("""select count(pg_advisory_xact_lock(hashtext(x))) 
+                from (select distinct x from unnest(%s::text[]) x order by x) s""", 
+            ([fqname + ":" + name for name in names],))
+
+    def lockForWrite(self, names):
+        #
+        # called by writers at the beginning of the transaction: locks the folder in shared mode and the objects,
+        # then looks up the folder tables. The lookup is a separate statement executed after the locks are granted,
+        # so it sees the tables created by online migrations (see buildOnline) even if the folder cache is stale
+        #
+        namespace, name, fqname = self.DB.namespace_name(self.Name)
+        relnames = self.relation_names(name)
+        c = self.execute("""select pg_advisory_xact_lock_shared(hashtext(%s));
+                select count(pg_advisory_xact_lock(hashtext(x))) 
+                    from (select distinct x from unnest(%s::text[]) x order by x) s;
+                select c.relname from pg_class c, pg_namespace n
+                    where n.oid = c.relnamespace and n.nspname = %s and c.relkind in ('r', 'p', 'i', 'I')
+                        and c.relname = any(%s)""", 
+            (fqname, [fqname + ":" + name for name in names], namespace, list(relnames)))
+        self.Tables = set(relnames[relname] for (relname,) in c.fetchall())
+        self.DB.FolderCache.put(self.DB.dbKey(), fqname, self.Tables)
+
+    def updateValidity(self, names=None):
+        #
+        # recomputes tv_end for all versions of the objects, or for all objects in the folder if names is None
+        #
+        self.execute("""
+            update %t_versions set tv_end = tv 
+                where deleted and tv_end is distinct from tv 
+                    and (%s::text[] is null or object = any(%s::text[]));
+            with candidates as (
+                select id, object, tv, 
+                        min(tv) over (partition by object order by tr desc, tv desc, id desc
+                                        rows between unbounded preceding and 1 preceding) as min_later_tv
+                    from %t_versions
+                    where not deleted and (%s::text[] is null or object = any(%s::text[]))
+            ),
+            effective as (
+                select id, lead(tv) over (partition by object order by tv) as tv_end
+                    from candidates
+                    where min_later_tv is null or tv < min_later_tv
+            ),
+            computed as (
+                select c.id, case when e.id is null then c.tv else e.tv_end end as tv_end
+                    from candidates c left outer join effective e on e.id = c.id
+            )
+            update %t_versions v set tv_end = computed.tv_end
+                from computed
+                where v.id = computed.id and v.tv_end is distinct from computed.tv_end""", (names, names, names, names))
+
+    def addValidity(self, name, vid, tr, tv):
+        #
+        # called by createVersion within its transaction after the version is inserted, the object is locked by lockForWrite
+        # if the new version is the latest one, updates the intervals incrementally, otherwise recomputes them for the object
+        #
+        if not self.maintained(self.ValidityIndex):
+            return
+        c = self.execute("""select exists (select 1 from %t_versions 
+                    where object = %s and tr >= %s and (tr, tv, id) > (%s, %s, %s))""", (name, tr, tr, tr, tv, vid))
+        if c.fetchone()[0]:
+            self.updateValidity([name])
+        else:
+            self.execute("""
+                update %t_versions set tv_end = tv
+                    where object = %s and id != %s and tv >= %s and (tv_end is null or tv_end > tv);
+                update %t_versions set tv_end = %s
+                    where object = %s and id != %s and tv < %s and (tv_end is null or tv_end > %s)""",
+                (name, vid, tv, tv, name, vid, tv, tv))
+
+    def createValidityIndex(self, batch_size=1000, progress=None):
+        #
+        # online migration for folders created before the validity intervals were introduced:
+        # computes tv_end for all versions (see buildOnline), then builds the index with "create index concurrently"
+        #
+        from .UConDB_migrations import UCDIndexMigration
+        index = UCDIndexMigration("validity intervals index", "versions", self.ValidityIndex, self.ValidityIndexDefinition)
+        self.buildOnline(self.ValidityIndex, None, self.updateValidity, batch_size=batch_size, progress=progress,
+                    finish=lambda: index.apply(self, progress=progress))
+
+    @staticmethod
+    def parse_partitioning(spec):
+        # "tr:month", "tr:year" or "object:<n>" -> (partition column, period or number of hash partitions)
+        column, _, param = spec.partition(":")
+        if column == "tr" and param in ("", "month", "year"):
+            return "tr", param or "month"
+        elif column == "object":
+            n = int(param or 8)
+            if n > 0:
+                return "object", n
+        raise ValueError("Unknown partitioning specification: %s" % (spec,))
+
+    def partitioning(self):
+        # returns partitioning specification of the versions table or None if it is not partitioned
+        if not hasattr(self, "_Partitioning"):
+            c = self.execute("""select obj_description(to_regclass(%s), 'pg_class')""", (self.Name + "_versions",))
+            comment = (c.fetchone() or (None,))[0] or ""
+            self._Partitioning = comment[len(self.PartitioningComment):] \
+                        if comment.startswith(self.PartitioningComment) else None
+        return self._Partitioning
+
+    def uniqueKeyIndex(self):
+        # True if (object, key) uniqueness is enforced by an index, otherwise it is enforced under the object lock
+        return not self.hasTable(self.RangePartition)
+
+    @staticmethod
+    def partition_periods(since, until, period):
+        # generates [begin, end) periods covering [since, until] as UTC datetimes and partition name suffixes
+        t = since.astimezone(timezone.utc)
+        t = datetime(t.year, 1 if period == "year" else t.month, 1, tzinfo=timezone.utc)
+        while t <= until:
+            if period == "year":
+                end, suffix = t.replace(year=t.year + 1), "y%04d" % (t.year,)
+            else:
+                end = t.replace(year=t.year + 1, month=1) if t.month == 12 else t.replace(month=t.month + 1)
+                suffix = "y%04dm%02d" % (t.year, t.month)
+            yield t, end, suffix
+            t = end
+
+    def createPartitionedVersions(self, partitioning, suffix="", since=None, validity_index=True):
+        column, param = self.parse_partitioning(partitioning)
+        self.execute(self.CreatePartitionedVersions.format(suffix=suffix, column=column, 
+                    method = "range" if column == "tr" else "hash",
+                    unique = "" if column == "tr" else "unique",
+                    comment = self.PartitioningComment + partitioning))
+        if validity_index:
+            self.execute(self.CreatePartitionedValidityIndex.format(suffix=suffix))
+        if column == "tr":
+            self.execute(f"create table %t_versions_default partition of %t_versions{suffix} default")
+            self.createRangePartitions(since, 12, param, suffix)
+        else:
+            for i in range(param):
+                self.execute(f"""create table %t_versions_h{i} partition of %t_versions{suffix} 
+                                    for values with (modulus {param}, remainder {i})""")
+
+    def createRangePartitions(self, since, ahead, period, suffix=""):
+        # creates missing tr range partitions from "since" (default: now) to "ahead" periods from now
+        now = datetime.now(timezone.utc)
+        # partitions are aligned to the first day of the period, day=1 also avoids Feb 29 in non-leap years
+        until = now.replace(day=1, year=now.year + ahead) if period == "year" else \
+                now.replace(day=1, year=now.year + (now.month - 1 + ahead)//12, month=(now.month - 1 + ahead) % 12 + 1)
+        created = []
+        for begin, end, name_suffix in self.partition_periods(since or now, until, period):
+            c = self.execute("select to_regclass(%s) is null", (f"{self.Name}_versions_{name_suffix}",))
+            if c.fetchone()[0]:
+                self.execute(f"""create table %t_versions_{name_suffix} partition of %t_versions{suffix} 
+                                    for values from ('{begin.isoformat()}') to ('{end.isoformat()}')""")
+                created.append(name_suffix)
+        return created
+
+    def addPartitions(self, ahead=12):
+        #
+        # creates tr range partitions for the next "ahead" periods, returns list of created partition name suffixes
+        # has to be run periodically, the versions created after the last partition go to the default partition
+        #
+        p = self.partitioning()
+        if p is None or self.parse_partitioning(p)[0] != "tr":
+            raise ValueError("Folder %s is not partitioned by tr" % (self.Name,))
+        created = self.createRangePartitions(None, ahead, self.parse_partitioning(p)[1])
+        self.execute("commit")
+        return created
+
+    #
+    # Online migration of an existing folder to partitioned versions table:
+    #   1. create the new partitioned table %t_versions_new and the trigger which records ids of changed versions
+    #   2. copy versions in batches by id
+    #   3. copy versions changed since they were copied, repeat while there are many of them
+    #   4. lock the versions table, copy remaining changes, rename the tables and indexes
+    # Reads and writes are blocked only during the last step. The old table is kept as %t_versions_unpartitioned.
+    #
+    TrackChanges = """
+create table %t_versions_changed (id integer);
+
+create function %t_versions_track() returns trigger language plpgsql as $$
+begin
+    if tg_op = 'DELETE' then
+        insert into %t_versions_changed(id) values (old.id);
+        return old;
+    end if;
+    insert into %t_versions_changed(id) values (new.id);
+    return new;
+end $$;
+
+create trigger %T_versions_track after insert or update or delete on %t_versions 
+    for each row execute procedure %t_versions_track();
+"""
+
+    SwapVersions = """
+drop trigger %T_versions_track on %t_versions;
+drop function %t_versions_track();
+drop table %t_versions_changed;
+alter table %t_tags drop constraint if exists %T_tags_version_id_fkey;
+alter table if exists %t_latest drop constraint if exists %T_latest_version_id_fkey;
+alter sequence %t_versions_id_seq owned by none;
+alter table %t_versions rename to %T_versions_unpartitioned;
+alter index %t_versions_pkey rename to %T_versions_unpartitioned_pkey;
+alter index %t_versions_inx rename to %T_versions_unpartitioned_inx;
+alter index %t_object_key_inx rename to %T_object_key_unpartitioned_inx;
+alter index if exists %t_versions_tv_end_inx rename to %T_versions_unpartitioned_tv_end_inx;
+alter index if exists %t_versions_object_tr_inx rename to %T_versions_unpartitioned_object_tr_inx;
+alter index if exists %t_versions_page_inx rename to %T_versions_unpartitioned_page_inx;
+alter index if exists %t_versions_tr_brin rename to %T_versions_unpartitioned_tr_brin;
+alter table %t_versions_new rename to %T_versions;
+alter index %t_versions_new_pkey rename to %T_versions_pkey;
+alter index %t_versions_new_inx rename to %T_versions_inx;
+alter index %t_object_key_new_inx rename to %T_object_key_inx;
+alter index if exists %t_versions_new_tv_end_inx rename to %T_versions_tv_end_inx;
+alter index %t_versions_new_object_tr_inx rename to %T_versions_object_tr_inx;
+alter index %t_versions_new_page_inx rename to %T_versions_page_inx;
+alter index %t_versions_new_tr_brin rename to %T_versions_tr_brin;
+alter sequence %t_versions_id_seq owned by %t_versions.id;
+"""
+
+    def copyChangedVersions(self):
+        # copies versions recorded by the migration trigger to the new table, returns number of versions copied
+        c = self.execute("delete from %t_versions_changed returning id")
+        ids = list(set(vid for (vid,) in c.fetchall()))
+        if ids:
+            self.execute(f"""delete from %t_versions_new where id = any(%s);
+                    insert into %t_versions_new({self.VersionColumns}) 
+                        select {self.VersionColumns} from %t_versions where id = any(%s)""", (ids, ids))
+        return len(ids)
+
+    def migrateToPartitioned(self, partitioning, batch_size=10000, progress=None):
+        #
+        # progress: callable(phase, done, total) called after each step, phases: "copy", "changes", "swap"
+        #
+        if self.partitioning():
+            raise ValueError("Folder %s is already partitioned" % (self.Name,))
+        self.parse_partitioning(partitioning)
+
+        self.execute("begin")
+        self.execute(self.TrackChanges)
+        c = self.execute("select min(tr), max(id) from %t_versions")
+        min_tr, max_id = c.fetchone()
+        self.createPartitionedVersions(partitioning, suffix="_new", since=min_tr, 
+                    validity_index=self.maintained(self.ValidityIndex))
+        self.execute("commit")
+
+        max_id = max_id or 0
+        last_id = 0
+        while last_id < max_id:
+            self.execute(f"""insert into %t_versions_new({self.VersionColumns}) 
+                    select {self.VersionColumns} from %t_versions where id > %s and id <= %s""", (last_id, last_id + batch_size))
+            self.execute("commit")
+            last_id = min(last_id + batch_size, max_id)
+            if progress is not None:
+                progress("copy", last_id, max_id)
+
+        while True:
+            n = self.copyChangedVersions()
+            self.execute("commit")
+            if progress is not None:
+                progress("changes", n, None)
+            if n < batch_size//10 + 1:
+                break
+
+        self.execute("begin")
+        # writers which looked up the folder tables before the swap finish first, see lockForWrite
+        self.execute("select pg_advisory_xact_lock(hashtext(%s))", (self.DB.namespace_name(self.Name)[2],))
+        self.execute("lock table %t_versions in access exclusive mode")
+        self.copyChangedVersions()
+        self.execute(self.SwapVersions)
+        self.tablesChanged()
+        if progress is not None:
+            progress("swap", 1, 1)
+
+        if self.DB.IntervalIndex is not None:
+            self.DB.IntervalIndex.invalidate(self.Name)
+        del self._Partitioning
+
     def fetchData(self, data_key):
         return self.DataInterface.fetchData(self.Name, data_key)
                         
@@ -265,22 +1457,121 @@ create table %t_salt
         if not name:
             raise ValueError("Object name is empty or None")
         return UCDObject(self, name)
-        
+
+    def createVersions(self, items, override_key=False, batch_size=1000):
+        #
+        # items: iterable of tuples (object, data, tv, key, tags), object is either object name or UCDObject
+        # tv, key and tags can be None
+        # versions are created in transactions of up to batch_size versions each
+        # returns list of created UCDVersion objects in the order of items
+        #
+        out = []
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                out += self.createVersionsBatch(batch, override_key)
+                batch = []
+        if batch:
+            out += self.createVersionsBatch(batch, override_key)
+        return out
+
+    def createVersionsBatch(self, batch, override_key=False):
+        objects = {}
+        names, blobs, tvs, keys, tags = [], [], [], [], []
+        for o, data, tv, key, vtags in batch:
+            name = o if isinstance(o, str) else o.Name
+            if not name:
+                raise ValueError("Object name is empty or None")
+            if name not in objects:
+                objects[name] = o if isinstance(o, UCDObject) else UCDObject(self, name)
+            if isinstance(vtags, str):
+                vtags = [vtags]
+            names.append(name)
+            blobs.append(to_bytes(data))
+            tvs.append(float(tv or 0.0))
+            keys.append(key)
+            tags.append(sorted(set(vtags or [])))
+
+        keyed = [(name, key) for name, key in zip(names, keys) if key is not None]
+        if len(set(keyed)) != len(keyed):
+            raise ValueError("Duplicate (object, key) pairs in the batch")
+
+        c = self.execute("begin")
+        # all object locks are taken at once in sorted order before anything is written, so that
+        # concurrent overlapping batches can not deadlock
+        self.lockForWrite(sorted(objects.keys()))
+        if keyed:
+            c = self.execute("""select v.id, v.object, v.tr, v.tv, v.data_key, v.data_size, v.adler32, v.key
+                    from %t_versions v, unnest(%s::text[], %s::text[]) as k(object, key)
+                    where v.object = k.object and v.key = k.key""",
+                ([name for name, _ in keyed], [key for _, key in keyed]))
+            existing = c.fetchall()
+            if existing:
+                if not override_key:
+                    c.execute("rollback")
+                    vid, name, tr, tv, data_key, data_size, adler32, key = existing[0]
+                    raise KeyExistsException(UCDVersion(UCDObject(self, name), vid, tr, tv, data_key, data_size, adler32, key=key))
+                self.execute("""update %t_versions set key=null where id = any(%s)""", ([tup[0] for tup in existing],))
+
+        data_keys = self.DataInterface.putDataBulk(self.Name, blobs)
+        sizes = [len(data) for data in blobs]
+        a32s = [zlib.adler32(data) & 0xFFFFFFFF for data in blobs]
+
+        c = self.execute("""select nextval('%t_versions_id_seq') from generate_series(1, %s)""", (len(blobs),))
+        vids = [vid for (vid,) in c.fetchall()]
+        c = self.execute("""insert into %t_versions(id, key, tv, object, data_key, data_size, adler32)
+                    select * from unnest(%s::int[], %s::text[], %s::float[], %s::text[], %s::text[], %s::bigint[], %s::bigint[])
+                    returning id, tr""", (vids, keys, tvs, names, data_keys, sizes, a32s))
+        trs = dict(c.fetchall())
+        tag_vids = [vid for vid, vtags in zip(vids, tags) for t in vtags]
+        tag_names = [t for vtags in tags for t in vtags]
+        if tag_names:
+            self.execute("""insert into %t_tags(version_id, tag_name)
+                    select * from unnest(%s::int[], %s::text[])""", (tag_vids, tag_names))
+        self.updateObjectsCatalog(names, [trs[vid] for vid in vids], tvs, sizes)
+        self.updateLatest(names, vids, [trs[vid] for vid in vids], tvs)
+        if self.maintained(self.ValidityIndex):
+            self.updateValidity(list(objects.keys()))
+        self.DB.notifyMany("version", self.Name, list(dict(zip(names, vids)).items()))
+        c.execute("commit")
+
+        versions = []
+        index = self.DB.IntervalIndex
+        for vid, name, tv, key, data_key, size, a32, vtags in zip(vids, names, tvs, keys, data_keys, sizes, a32s, tags):
+            o = objects[name]
+            tr = trs[vid]
+            v = UCDVersion(o, vid, tr, tv, data_key, size, a32, key=key)
+            v.Tags = vtags
+            versions.append(v)
+            if index is not None:
+                index.add(o, vid, tr, tv, data_key, size, a32, key=key)
+        return versions
+
     def getObject(self, name):
-        c = self.execute("""
-            select * from %t_versions
-                where object=%s and not deleted
-                limit 1""", (name,))
+        if self.ready("objects"):
+            c = self.execute("""
+                select 1 from %t_objects
+                    where name=%s and version_count > 0""", (name,))
+        else:
+            c = self.execute("""
+                select * from %t_versions
+                    where object=%s and not deleted
+                    limit 1""", (name,))
         tup = c.fetchone()
         if not tup: return None
         return UCDObject(self, name)
         
     def objectCount(self):
-        c = self.execute("""
-            select count(*) from (
-                select distinct object from %t_versions
-                    where not deleted 
-                    order by object) as objects""")
+        if self.ready("objects"):
+            c = self.execute("""
+                select count(*) from %t_objects where version_count > 0""")
+        else:
+            c = self.execute("""
+                select count(*) from (
+                    select distinct object from %t_versions
+                        where not deleted 
+                        order by object) as objects""")
         return c.fetchone()[0]
                               
     def versionCount(self):
@@ -298,12 +1589,20 @@ create table %t_salt
             page = " limit %d " % (limit,)
         if offset != None:
             page += " offset %d " % (offset,)
-        sql = f"""select distinct object from %t_versions
-                where not deleted 
-                    and ( %s is null or object like (%s || '%%') )
-                order by object 
-                {page}
-                """
+        if self.ready("objects"):
+            sql = f"""select name from %t_objects
+                    where version_count > 0
+                        and ( %s is null or name like (%s || '%%') )
+                    order by name 
+                    {page}
+                    """
+        else:
+            sql = f"""select distinct object from %t_versions
+                    where not deleted 
+                        and ( %s is null or object like (%s || '%%') )
+                    order by object 
+                    {page}
+                    """
         #print sql
         c = self.execute(sql, (begins_with, begins_with))
         return [UCDObject(self, name) for (name,) in c.fetchall()]   
@@ -314,24 +1613,128 @@ create table %t_salt
             select tag_name from %t_tags order by tag_name""")
         return [x[0] for x in c.fetchall()]  
         
+    def tagVersions(self, tag, ids=None, keys=None, tv=None, tr=None, objects=None):
+        #
+        # adds the tag to multiple versions in one transaction. The versions are specified by one of:
+        #   ids:                    list of version ids
+        #   keys:                   list of (object name, version key) pairs
+        #   tv, tr, objects:        snapshot - versions effective at tv (recorded before tr, if specified) 
+        #                           of the listed objects or of all the objects in the folder
+        # returns list of ids of versions newly tagged
+        #
+        if type(tr) in (type(1), type(1.0)):
+            tr = datetime.fromtimestamp(tr)
+        assert tr is None or isinstance(tr, datetime)
+        if ids is not None:
+            sql = """insert into %t_tags(version_id, tag_name)
+                    select v.id, %s from %t_versions v where v.id = any(%s::int[])
+                    on conflict do nothing
+                    returning version_id"""
+            args = (tag, list(ids))
+        elif keys is not None:
+            sql = """insert into %t_tags(version_id, tag_name)
+                    select v.id, %s 
+                        from %t_versions v, unnest(%s::text[], %s::text[]) as k(object, key)
+                        where v.object = k.object and v.key = k.key
+                    on conflict do nothing
+                    returning version_id"""
+            args = (tag, [o for o, _ in keys], [k for _, k in keys])
+        elif tv is not None:
+            if objects is not None:
+                source = "select unnest(%s::text[]) as name"
+                args = (tag, list(objects))
+            elif self.ready("objects"):
+                source = "select name from %t_objects where version_count > 0"
+                args = (tag,)
+            else:
+                source = "select distinct object as name from %t_versions where not deleted"
+                args = (tag,)
+            sql = f"""insert into %t_tags(version_id, tag_name)
+                    select v.id, %s 
+                        from ({source}) o
+                        cross join lateral (
+                            select vv.id from %t_versions vv
+                                where vv.object = o.name and vv.tv <= %s
+                                    and (%s::timestamptz is null or vv.tr < %s::timestamptz)
+                                order by vv.tr desc, vv.tv desc
+                                limit 1
+                        ) v
+                    on conflict do nothing
+                    returning version_id"""
+            args = args + (float(tv), tr, tr)
+        else:
+            raise ValueError("One of ids, keys or tv must be specified")
+        c = self.execute("begin")
+        c = self.execute(sql, args)
+        tagged = [vid for (vid,) in c.fetchall()]
+        if tagged:
+            self.DB.notify("tag", self.Name, tag=tag)
+        c.execute("commit")
+        return tagged
+
     def getVersionByID(self, vid):
-        c = self.execute("""select object, tr, tv, data_key, data_size, key, adler32 from %t_versions where id=%s""", (vid,))
+        c = self.executePrepared("version_by_id", f"""select object, tr, tv, data_key, data_size, key, adler32, {TagsColumn} 
+            from %t_versions v where id=%s""", (vid,))
         tup = c.fetchone()
         if tup == None: return None
-        name, tr, tv, data_key, data_size, key, adler32 = tup
+        name, tr, tv, data_key, data_size, key, adler32, tags = tup
         o = UCDObject(self, name)
-        v = UCDVersion(o, vid, tr, tv, data_key, data_size, adler32, key=key)
+        v = UCDVersion(o, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
         return v
         
     def getVersionsByIDs(self, ids):
         # yields pairs (id, UCVVersion)
-        c = self.execute("""select object, id, tr, tv, data_key, data_size, key, adler32 from %t_versions 
-            where id=any(%s)""", (ids,))
-        for name, vid, tr, tv, data_key, data_size, key, adler32 in cursor_generator(c):
-            o = UCDObject(self, name)
-            v = UCDVersion(o, vid, tr, tv, data_key, data_size, adler32, key=key)
+        c = self.execute(f"""select object, id, tr, tv, data_key, data_size, key, adler32, {TagsColumn} from %t_versions v
+            where id=any(%s)""", (ids,), server_side=True)
+        objects = {}        # versions of the same object share the UCDObject
+        for name, vid, tr, tv, data_key, data_size, key, adler32, tags in cursor_generator(c):
+            o = objects.get(name)
+            if o is None:
+                o = objects[name] = UCDObject(self, name)
+            v = UCDVersion(o, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
             yield v
             
+    def resolveVersions(self, lookups, tag=None, tr=None):
+        #
+        # lookups: iterable of (object, tv) pairs, object is either object name or UCDObject
+        # resolves all the pairs with single query
+        # yields tuples (object name, tv, UCDVersion) in the order of lookups. If a version is not found, the pair is not present in the output
+        #
+        assert tag is None or isinstance(tag, str)
+        if type(tr) in (type(1), type(1.0)):
+            tr = datetime.fromtimestamp(tr)
+        assert tr is None or isinstance(tr, datetime)
+        names = []
+        tvs = []
+        for o, tv in lookups:
+            names.append(o if isinstance(o, str) else o.Name)
+            tvs.append(float(tv))
+        if not names:
+            return
+        c = self.execute(f"""
+            select q.object, q.tv, v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from unnest(%s::text[], %s::float[]) with ordinality as q(object, tv, i)
+                cross join lateral (
+                    select vv.id, vv.tr, vv.tv, vv.data_key, vv.data_size, vv.key, vv.adler32
+                        from %t_versions vv
+                        where vv.object = q.object and vv.tv <= q.tv
+                            and (%s::timestamptz is null or vv.tr < %s::timestamptz)
+                            and (%s::text is null or exists (
+                                    select 1 from %t_tags t
+                                        where t.version_id = vv.id and t.tag_name = %s::text
+                                )
+                            )
+                        order by vv.tr desc, vv.tv desc
+                        limit 1
+                ) v
+                order by q.i""", (names, tvs, tr, tr, tag, tag))
+        objects = {}
+        for name, lookup_tv, vid, vtr, vtv, data_key, data_size, key, adler32, tags in cursor_generator(c):
+            o = objects.get(name)
+            if o is None:
+                o = objects[name] = UCDObject(self, name)
+            yield name, lookup_tv, UCDVersion(o, vid, vtr, vtv, data_key, data_size, adler32, key=key, tags=tags)
+
     def getVersionsDataByIDs(self, version_ids):
         # generator of pairs (version_id, BLOB). If a version is not found, it will not be present in the output
         data_key_to_id = {v.DataKey:v.ID for v in self.getVersionsByIDs(version_ids)}
@@ -350,6 +1753,8 @@ create table %t_salt
 
 class UCDObject:
 
+    __slots__ = ("Folder", "Name", "_LastVersion")
+
     def __init__(self, folder, name):
         self.Folder = folder
         self.Name = name
@@ -358,9 +1763,12 @@ class UCDObject:
     def dataInterface(self):
         return self.Folder.dataInterface()
 
-    def execute(self, sql, args=()):
+    def execute(self, sql, args=(), server_side=False):
         #print "Table.execute(%s, %s)" % (sql, args)
-        return self.Folder.execute(sql, args)
+        return self.Folder.execute(sql, args, server_side=server_side)
+
+    def executePrepared(self, query_id, sql, args=()):
+        return self.Folder.executePrepared(query_id, sql, args)
         
     def dataByDataKey(self, data_key):
         return self.dataInterface().getData(self.Folder.Name, data_key)        
@@ -371,8 +1779,12 @@ class UCDObject:
         #print("createVersion: len(data)=", len(data))
 
         tv = tv or 0.0
-    
+
         c = self.execute("begin")
+        self.Folder.lockForWrite([self.Name])
+        if self.Folder.uniqueKeyIndex() and self.Folder.DB.fusedWrites():
+            return self.createVersionFused(data, tv, key, tags, override_key)
+    
         if key != None:
             ov = self.getVersion(key=key)
             if ov != None:
@@ -392,131 +1804,209 @@ class UCDObject:
                     values(default, %s, %s, default, %s, %s, %s, %s)
                     returning id, tr, tv""", (key, tv, self.Name, data_key, data_size, a32))
         vid, tr, tv = c.fetchone()
+        self.Folder.updateObjectsCatalog([self.Name], [tr], [tv], [data_size])
+        self.Folder.updateLatest([self.Name], [vid], [tr], [tv])
+        self.Folder.addValidity(self.Name, vid, tr, tv)
         v = UCDVersion(self, vid, tr, tv, data_key, data_size, a32, key=key)
         for t in tags:
             v.addTag(t)
+        self.Folder.DB.notify("version", self.Folder.Name, self.Name, vid)
         c.execute("commit")
+        if self.Folder.DB.IntervalIndex is not None:
+            self.Folder.DB.IntervalIndex.add(self, vid, tr, tv, data_key, data_size, a32, key=key)
         return v
         
-    def listVersions(self, tr=None, tv=None, tr_since=None, tag=None, limit=None, offset=None):
+    def createVersionFused(self, data, tv, key, tags, override_key):
+        #
+        # used when the blobs are stored in the metadata database: the blob, the version, its tags
+        # and the catalog tables are written by one statement in one transaction, so a failed insert leaves no orphan blobs
+        # called by createVersion in the transaction started by lockForWrite
+        #
+        folder = self.Folder
+        storage = folder.DataInterface
+        data_table = storage.qualifiedTableName(folder.Name)
+        data_size = len(data)
+        a32 = zlib.adler32(data) & 0xFFFFFFFF
+        tags = sorted(set([tags] if isinstance(tags, str) else tags))
+
+        dedup = "" if not storage.DetectDuplicates else f"""
+                select d.key from {data_table} d, blob_data b 
+                    where d.hash = %s and d.size = %s and d.data = b.data 
+                    limit 1"""
+        ctes = [
+            "blob_data as (select %s::bytea as data)",
+            f"existing_blob as ({dedup or 'select null::bigint as key where false'})",
+            f"""new_blob as (
+                insert into {data_table}(size, hash, data) 
+                    select %s, %s, data from blob_data 
+                        where not exists (select 1 from existing_blob)
+                    returning key)""",
+            """ins as (
+                insert into %t_versions(key, tv, object, data_key, data_size, adler32)
+                    select %s::text, %s::float, %s, b.key::text, %s::bigint, %s::bigint
+                        from (select key from existing_blob union all select key from new_blob) b
+                    returning id, object, tr, tv, data_key, data_size)""",
+            """new_tags as (
+                insert into %t_tags(version_id, tag_name)
+                    select ins.id, t from ins, unnest(%s::text[]) t)"""
+        ]
+        args = [psycopg2.Binary(data)]
+        if storage.DetectDuplicates:
+            args += [a32, data_size]
+        args += [data_size, a32, key, tv, self.Name, data_size, a32, tags]
+        if folder.maintained("objects"):
+            ctes.append("objects_upsert as (%s)" % (folder.ObjectsUpsert.format(source="(select object as name, tr, tv, data_size as size from ins) v"),))
+        if folder.maintained("latest"):
+            ctes.append("latest_upsert as (%s)" % (folder.LatestUpsert.format(source="ins"),))
+        sql = "with " + ",\n".join(ctes) + "\nselect id, tr, tv, data_key from ins"
+        if key is not None and override_key:
+            sql = "update %t_versions set key=null where key=%s and object=%s;\n" + sql
+            args = [key, self.Name] + args
+
+        try:
+            c = self.execute(sql, args)
+        except psycopg2.IntegrityError:
+            self.execute("rollback")
+            ov = self.getVersion(key=key) if key is not None else None
+            if ov is None:
+                raise
+            raise KeyExistsException(ov)
+        vid, tr, tv, data_key = c.fetchone()
+        folder.addValidity(self.Name, vid, tr, tv)
+        folder.DB.notify("version", folder.Name, self.Name, vid)
+        c.execute("commit")
+        if folder.DB.IntervalIndex is not None:
+            folder.DB.IntervalIndex.add(self, vid, tr, tv, data_key, data_size, a32, key=key)
+        return UCDVersion(self, vid, tr, tv, data_key, data_size, a32, key=key, tags=tags)
+
+    def listVersions(self, tr=None, tv=None, tr_since=None, tag=None, limit=None, offset=None, after=None):
+        # after: page token returned by UCDVersion.pageToken() for the last version of the previous page
         assert tv is None or isinstance(tv, (int, float))
         assert tr_since is None or isinstance(tr_since, datetime)
         assert tag is None or isinstance(tag, str)
         assert limit is None or isinstance(limit, int)
         assert offset is None or isinstance(offset, int)
+        assert after is None or isinstance(after, str)
         filters = ""
-        if tr_since is not None:    filters += " and v.tr > '%s' " % (tr_since,)
-        if tv is not None:    filters += " and v.tv <= %s " % (tv,)
-        if tr is not None:    filters += " and v.tr <= '%s' " % (tr,)
-        limit = f"limit {limit}" if limit is not None else ""
-        offset = f"offset {offset}" if offset is not None else ""
+        args = []
+        if tr_since is not None:    
+            filters += " and v.tr > %s "
+            args.append(tr_since)
+        if tv is not None:
+            filters += " and v.tv <= %s "
+            args.append(tv)
+        if tr is not None:
+            filters += " and v.tr <= %s "
+            args.append(tr)
+        if after is not None:
+            # "v.tr <= %s" is redundant, it makes the page start a range scan of the versions_page_inx index
+            after_tr, after_tv, after_id = parse_page_token(after)
+            filters += " and v.tr <= %s and (v.tr < %s or v.tr = %s and (v.tv, v.id) > (%s, %s)) "
+            args += [after_tr, after_tr, after_tr, after_tv, after_id]
+        server_side = limit is None or limit > self.Folder.DB.ServerCursorBatch
+        args += [limit, offset]           # "limit null" and "offset null" are no-ops
         if tag is None:
-            sql = f"""select id, key, tr, tv, data_key, data_size, adler32
+            sql = f"""select id, key, tr, tv, data_key, data_size, adler32, {TagsColumn}
                     from %t_versions v
                     where not deleted and object=%s 
                     {filters}
-                    order by tr desc, tv
-                    {limit} {offset} 
+                    order by tr desc, tv, id
+                    limit %s offset %s
                     """
-            c = self.execute(sql, (self.Name,))
+            c = self.execute(sql, [self.Name] + args, server_side=server_side)
         else:
-            sql = f"""select v.id, v.key, v.tr, v.tv, v.data_key, v.data_size, v.adler32
+            sql = f"""select v.id, v.key, v.tr, v.tv, v.data_key, v.data_size, v.adler32, {TagsColumn}
                     from %t_versions v, %t_tags t
                     where not v.deleted and v.object=%s 
                         and v.id = t.version_id 
                         and t.tag_name = %s
                     {filters}
-                    order by v.tr desc, v.tv
-                    {limit} {offset} 
+                    order by v.tr desc, v.tv, v.id
+                    limit %s offset %s
                     """
-            c = self.execute(sql, (self.Name, tag))
+            c = self.execute(sql, [self.Name, tag] + args, server_side=server_side)
             
         #print("listVersions: sql:", sql)
-        return (UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key) for vid, key, tr, tv, data_key, data_size, adler32 in c.fetchall())
+        return (UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags) 
+                    for vid, key, tr, tv, data_key, data_size, adler32, tags in cursor_generator(c))
         
     def getVersionsForInterval(self, tv0, tv1, tag=None, tr=None):
-        # returns list of versions sorted by Tv in ascending order
+        #
+        # generator of versions effective at any Tv in [tv0, tv1], sorted by Tv in ascending order.
+        # The first version is the one effective at tv0.
+        #
+        # A version is effective for some Tv if no version recorded after it has lower or equal Tv,
+        # i.e. its Tv is below the minimum Tv of all the versions preceding it in "tr desc, tv desc" order.
+        #
         assert isinstance(tv0, (int, float))
         assert isinstance(tv1, (int, float))
+        if type(tr) in (type(1), type(1.0)):
+            tr = datetime.fromtimestamp(tr)
         assert tr is None or isinstance(tr, datetime)
         assert tag is None or isinstance(tag, str)
-        
-        v0 = self.getVersion(tag=tag, tr=tr, tv=tv0) # version immediately before tv0
 
-        tr_filter = "" if tr is None else " and v.tr <= '%s' " % (tr,)
-
-        if tag is None:
-            sql = f"""select id, key, tr, tv, data_key, data_size, adler32
+        if tag is None and tr is None and self.Folder.ready(UCDFolder.ValidityIndex):
+            c = self.execute(f"""
+                select v.id, v.key, v.tr, v.tv, v.data_key, v.data_size, v.adler32, {TagsColumn}
                     from %t_versions v
-                    where 
-                        not deleted 
-                        and object=%s 
-                        and tv > %s and tv <= %s
-                        and (%s is null or v.tr <= %s)
-                    order by tr desc, tv desc
-                    """
-            c = self.execute(sql, (self.Name, tv0, tv1, tr, tr))
-        else:
-            sql = f"""select v.id, v.key, v.tr, v.tv, v.data_key, v.data_size, v.adler32
-                    from %t_versions v, %t_tags t
-                    where not v.deleted and v.object=%s 
-                        and v.id = t.version_id 
-                        and t.tag_name = %s
-                        and tv > %s and tv <= %s
-                        and (%s is null or v.tr <= %s)
-                    order by v.tr desc, v.tv desc
-                    """
-            c = self.execute(sql, (self.Name, tag, tv0, tv1, tr, tr))
-            
-        last_version = None
-        versions = []
-        for vid, key, tr, tv, data_key, data_size, adler32 in cursor_generator(c):
-            if last_version is None or tv < last_version.Tv:
-                v = UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key)
-                versions.insert(0, v)
-                last_version = v
-        if v0 is not None:
-            versions.insert(0, v0)
-        return versions
+                    where v.object = %s and (v.tv_end is null or v.tv_end > v.tv)
+                        and coalesce(v.tv_end, 'infinity'::float) > %s and v.tv <= %s
+                    order by v.tv""", (self.Name, tv0, tv1), server_side=True)
+            for vid, key, tr, tv, data_key, data_size, adler32, tags in cursor_generator(c):
+                yield UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
+            return
+
+        sql = f"""
+            with effective as (
+                select id, key, tr, tv, data_key, data_size, adler32 from (
+                    select v.id, v.key, v.tr, v.tv, v.data_key, v.data_size, v.adler32,
+                            min(v.tv) over (order by v.tr desc, v.tv desc, v.id desc
+                                            rows between unbounded preceding and 1 preceding) as min_later_tv
+                        from %t_versions v
+                        where not v.deleted and v.object = %s and v.tv <= %s
+                            and (%s::timestamptz is null or v.tr < %s::timestamptz)
+                            and (%s::text is null or exists (
+                                    select 1 from %t_tags t
+                                        where t.version_id = v.id and t.tag_name = %s::text
+                                )
+                            )
+                ) candidates
+                where min_later_tv is null or tv < min_later_tv
+            )
+            select v.id, v.key, v.tr, v.tv, v.data_key, v.data_size, v.adler32, {TagsColumn} from (
+                    (select * from effective where tv <= %s order by tv desc limit 1)
+                    union all
+                    select * from effective where tv > %s
+                ) v
+                order by v.tv"""
+        c = self.execute(sql, (self.Name, tv1, tr, tr, tag, tag, tv0, tv0), server_side=True)
+        for vid, key, tr, tv, data_key, data_size, adler32, tags in cursor_generator(c):
+            yield UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
         
     def getVersionsByTvs(self, tvs, tag=None, tr=None):
         #
-        # yields pairs (tv, UCDVersion)
+        # yields pairs (tv, UCDVersion) sorted by tv, not in the order of the input list. Repeated tvs are repeated
+        # in the output. Tvs with no effective version (before the first one) are skipped, there are no (tv, None) pairs
         #
         
-        # sort tv list but remember original order so that the output can be matched back to the input
-        tv_indexed = sorted([(t,i) for i, t in enumerate(tvs)])
-        original_inx = [i for t,i in tv_indexed]
-        tvs = [t for t,i in tv_indexed]
+        tvs = sorted(tvs)
+        if not tvs:
+            return
         #print("getVersionsByTvs: tvs:", tvs)
-        tv0 = tvs[0]
-        tv1 = tvs[-1]
-        versions = self.getVersionsForInterval(tv0, tv1, tag=tag, tr=tr)        
-        # assume versions is sorted by tv and there are no repeating tvs
-        #print("all_versions:", versions)
-        if versions:
-            #
-            # skip to first tv, for which there is a version
-            #
-            v0 = versions[0]
-            for it, t in enumerate(tvs):
-                if t >= v0.Tv:
-                    break
-        
-            if it < len(tvs):
-                #
-                # at this point, tvs[it] >= versions[0].Tv
-                #
-                prev_v = versions[0]
-                for v in versions[1:]:
-                    while it < len(tvs) and tvs[it] < v.Tv:
-                        yield tvs[it], prev_v
-                        it += 1
-                    prev_v = v
-
-                while it < len(tvs):
+        versions = self.getVersionsForInterval(tvs[0], tvs[-1], tag=tag, tr=tr)
+        # versions are sorted by tv and there are no repeating tvs
+        it = 0
+        prev_v = None
+        for v in versions:
+            while it < len(tvs) and tvs[it] < v.Tv:
+                if prev_v is not None:
                     yield tvs[it], prev_v
-                    it += 1
+                it += 1
+            prev_v = v
+        if prev_v is not None:
+            while it < len(tvs):
+                yield tvs[it], prev_v
+                it += 1
 
     def getVersion(self, tag=None, tr=None, tv=None, key=None):
         # if tag is specified, tr is ignored
@@ -525,19 +2015,27 @@ class UCDObject:
 
         if key is not None:
             # get by key
-            c = self.execute("""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.adler32
+            c = self.executePrepared("version_by_key", f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.adler32, {TagsColumn}
                 from %t_versions v
                 where v.object = %s and v.key = %s""", (self.Name, key))
             tup = c.fetchone()
             if not tup: return None
-            vid, tr, tv, data_key, data_size, adler32 = tup
-            return UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key)
+            vid, tr, tv, data_key, data_size, adler32, tags = tup
+            return UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
 
         if type(tr) in (type(1), type(1.0)):
             tr = datetime.fromtimestamp(tr)
-            
+
+        if tag is None:
+            index = self.intervalIndex()
+            if index is not None:
+                e = index.lookup(tv, tr)
+                if e is None:   return None
+                tv, _, vid, tr, data_key, data_size, adler32, key = e
+                return UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key)
+
         if tag is not None:
-            c = self.execute("""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32
+            c = self.executePrepared("version_by_tag", f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
                 from %t_versions v, %t_tags t
                 where v.object = %s and v.tv <= %s and
                     v.id = t.version_id and
@@ -548,13 +2046,20 @@ class UCDObject:
             if type(tr) in (type(1), type(1.0)):
                 tr = datetime.fromtimestamp(tr)
             
-            c = self.execute("""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32
+            c = self.executePrepared("version_by_tr_tv", f"""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32, {TagsColumn}
                 from %t_versions v
                 where v.object = %s and v.tr < %s and v.tv <= %s
                 order by v.tr desc, v.tv desc
                 limit 1""", (self.Name, tr, tv))
+        elif self.Folder.ready(UCDFolder.ValidityIndex):
+            c = self.executePrepared("version_by_tv_end", f"""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s and (v.tv_end is null or v.tv_end > v.tv)
+                    and coalesce(v.tv_end, 'infinity'::float) > %s and v.tv <= %s
+                order by coalesce(v.tv_end, 'infinity'::float)
+                limit 1""", (self.Name, tv, tv))
         else:
-            c = self.execute("""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32
+            c = self.executePrepared("version_by_tv", f"""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32, {TagsColumn}
                 from %t_versions v
                 where v.object = %s and v.tv <= %s
                 order by v.tr desc, v.tv desc
@@ -562,8 +2067,8 @@ class UCDObject:
             
         tup = c.fetchone()
         if not tup: return None
-        vid, tr, tv, data_key, data_size, key, adler32 = tup
-        return UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key)
+        vid, tr, tv, data_key, data_size, key, adler32, tags = tup
+        return UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
 
     def getVersionsByKeys(self, keys=None, key_min=None, key_max=None):
         # key_range: (min, max)
@@ -575,32 +2080,69 @@ class UCDObject:
         t0 = time.time()
         
         if keys:
-            c = self.execute(f"""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32
+            c = self.execute(f"""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32, {TagsColumn}
                 from %t_versions v
                 where v.object = %s and v.key = any(%s)
-                """, (self.Name, keys))
+                """, (self.Name, keys), server_side=True)
         else:
-            c = self.execute(f"""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32
+            c = self.execute(f"""select v.id, v.tr, v.tv, v.data_key, data_size, v.key, v.adler32, {TagsColumn}
                 from %t_versions v
                 where v.object = %s
                     and ( %s is null or key >= %s )
                     and ( %s is null or key < %s )
                 """, 
-                (self.Name, key_min, key_min, key_max, key_max))
+                (self.Name, key_min, key_min, key_max, key_max), server_side=True)
                 
         t1 = time.time()
 
-        for vid, tr, tv, data_key, data_size, key, adler32 in cursor_generator(c):
-            yield UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key)
+        for vid, tr, tv, data_key, data_size, key, adler32, tags in cursor_generator(c):
+            yield UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
             
         t2 = time.time()
         
         #print("getVersionsByKeys times:", t1-t0, t2-t1)
 
+    def intervalIndex(self):
+        # returns UCDIntervalIndex for the object or None if the interval index is not enabled
+        cache = self.Folder.DB.IntervalIndex
+        if cache is None:
+            return None
+        return cache.get(self)
+
+    def loadIndexRows(self):
+        c = self.execute("""select id, tr, tv, data_key, data_size, adler32, key
+            from %t_versions
+            where object = %s""", (self.Name,))
+        return c.fetchall()
+
+    def latestVersion(self):
+        # returns the last version in "tr desc, tv desc" order, regardless of its Tv, or None
+        if self.Folder.ready("latest"):
+            c = self.executePrepared("latest_version", f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_latest l, %t_versions v
+                where l.object = %s and v.id = l.version_id""", (self.Name,))
+        else:
+            c = self.executePrepared("latest_version_scan", f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s and not v.deleted
+                order by v.tr desc, v.tv desc, v.id desc
+                limit 1""", (self.Name,))
+        tup = c.fetchone()
+        if not tup: return None
+        vid, tr, tv, data_key, data_size, key, adler32, tags = tup
+        return UCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=tags)
+
     @property
     def LastVersion(self):
+        # version effective now
         if self._LastVersion == None:
-            self._LastVersion = self.getVersion()
+            if self.Folder.ready("latest"):
+                v = self.latestVersion()
+                if v is not None and v.Tv > time.time():
+                    v = self.getVersion()
+            else:
+                v = self.getVersion()
+            self._LastVersion = v
         return self._LastVersion
         
     def versionCount(self, include_deleted = False):
@@ -612,7 +2154,10 @@ class UCDObject:
         
 class UCDVersion:
 
-    def __init__(self, object, vid, tr, tv, data_key, data_size, adler32, key=None):
+    # bulk lookups create many of these, keep them small
+    __slots__ = ("Object", "ID", "Tr", "Tv", "DataKey", "DataSize", "Adler32", "Key", "LookupTv", "__Data", "Tags")
+
+    def __init__(self, object, vid, tr, tv, data_key, data_size, adler32, key=None, tags=None):
         self.Object = object
         self.ID = vid
         self.Tr = tr
@@ -623,7 +2168,7 @@ class UCDVersion:
         self.Key = key
         self.LookupTv = None        # if the version was found by Tv, this will be populated
         self.__Data = None
-        self.Tags = None
+        self.Tags = tags            # None - not loaded yet
         
     def execute(self, sql, args=()):
         #print "Table.execute(%s, %s)" % (sql, args)
@@ -644,9 +2189,11 @@ class UCDVersion:
             delete from %t_tags
                 where tag_name = %s and version_id = %s;
             insert into %t_tags(version_id, tag_name)
-                values(%s, %s);
-            commit""", (tag, self.ID, self.ID, tag))
-        self.Tags = (self.Tags or []).append(tag)
+                values(%s, %s)""", (tag, self.ID, self.ID, tag))
+        self.Object.Folder.DB.notify("tag", self.Object.Folder.Name, self.Object.Name, self.ID, tag=tag)
+        c.execute("commit")
+        if self.Tags is not None and tag not in self.Tags:
+            self.Tags = sorted(self.Tags + [tag])
             
     def getTags(self):
         if self.Tags is None:
@@ -675,6 +2222,10 @@ class UCDVersion:
             out["lookup_tv"] = self.LookupTv
         return out
         
+    def pageToken(self):
+        # opaque continuation token for UCDObject.listVersions(after=...)
+        return page_token(self.Tr, self.Tv, self.ID)
+
     def set_lookup_tv(self, tv):
         self.LookupTv = tv
         return self
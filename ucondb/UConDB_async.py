@@ -0,0 +1,515 @@
+#
+# Asyncio version of the UConDB API, built on asyncpg
+#
+# Reads are executed natively with asyncpg connection pools. Writes reuse the synchronous implementation
+# running in an executor thread, so that tables maintained by createVersion stay consistent.
+# Only Postgres data storage is supported.
+#
+
+import asyncio, asyncpg, time
+from datetime import datetime, timezone
+from .UConDB import UConDB, UCDFolder, UCDObject, UCDVersion, TagsColumn, parse_page_token
+from .backends import UCDPostgresDataStorage
+from .tools import to_bytes
+from wsdbtools import ConnectionPool
+
+def as_tr(tr):
+    # asyncpg needs timezone-aware datetime for timestamptz parameters
+    if type(tr) in (type(1), type(1.0)):
+        return datetime.fromtimestamp(tr, timezone.utc)
+    assert tr is None or isinstance(tr, datetime)
+    if tr is not None and tr.tzinfo is None:
+        tr = tr.astimezone()
+    return tr
+
+def connect_args(connstr):
+    # asyncpg accepts URI DSNs only, "key=value ..." connection strings are converted to keyword arguments
+    if "://" in connstr:
+        return {"dsn": connstr}
+    args = {}
+    for word in connstr.split():
+        k, v = word.split("=", 1)
+        if k == "dbname":   k = "database"
+        if k == "port":     v = int(v)
+        args[k] = v
+    return args
+
+class AsyncUCDVersion(UCDVersion):
+
+    __slots__ = ()
+
+    async def data(self):
+        if self.Data is None:
+            self.Data = await self.Object.Folder.DB.getData(self.Object.Folder.Name, self.DataKey)
+        return self.Data
+
+    def __get_data(self):
+        return self._UCDVersion__Data
+
+    def __set_data(self, data):
+        self._UCDVersion__Data = data
+
+    Data = property(__get_data, __set_data)         # not loaded implicitly, use "await data()"
+
+class AsyncUConDB:
+
+    FolderCache = UConDB.FolderCache        # shared with the synchronous API
+    CursorPrefetch = 1000
+
+    def __init__(self, connstr, data_connstr=None, default_namespace="public", data_namespace=None,
+                min_size=1, max_size=10, folder_cache=None, notify_channel=None, interval_index=None, instrumentation=None):
+        #
+        # notify_channel, interval_index, instrumentation: see UConDB. They are used by the synchronous UConDB 
+        # for writes as well. The interval index sees versions created by other processes only if UCDChangeListener runs
+        #
+        self.ConnStr = connstr
+        self.DataConnStr = data_connstr or connstr
+        self.DefaultNamespace = default_namespace
+        self.DataNamespace = data_namespace or default_namespace
+        self.MinSize = min_size
+        self.MaxSize = max_size
+        self.Pool = self.DataPool = None
+        self.SQL = {}           # {(table, sql): SQL text with $n parameters}
+        if folder_cache is not None:
+            self.FolderCache = folder_cache
+        self.NotifyChannel = notify_channel
+        self.IntervalIndex = interval_index
+        self.Instrumentation = instrumentation
+        self.SyncPool = self.SyncDataStorage = None
+
+    async def connect(self):
+        # search_path is set once per connection when it is created by the pool
+        if self.Pool is None:
+            self.Pool = await asyncpg.create_pool(**connect_args(self.ConnStr), min_size=self.MinSize, max_size=self.MaxSize,
+                            server_settings={"search_path": self.DefaultNamespace})
+            if self.DataConnStr == self.ConnStr and self.DataNamespace == self.DefaultNamespace:
+                self.DataPool = self.Pool
+            else:
+                self.DataPool = await asyncpg.create_pool(**connect_args(self.DataConnStr), min_size=self.MinSize, max_size=self.MaxSize,
+                            server_settings={"search_path": self.DataNamespace})
+        return self.Pool
+
+    async def close(self):
+        if self.DataPool is not None and self.DataPool is not self.Pool:
+            await self.DataPool.close()
+        if self.Pool is not None:
+            await self.Pool.close()
+        self.Pool = self.DataPool = None
+
+    def namespace_name(self, name):
+        if "." in name:
+            return tuple(name.split(".", 1)) + (name,)
+        else:
+            return self.DefaultNamespace, name, self.DefaultNamespace + "." + name
+
+    def sql(self, table, sql):
+        # converts %t, %T and %s in the SQL text. asyncpg prepares and caches the statements per connection
+        k = (table, sql)
+        out = self.SQL.get(k)
+        if out is None:
+            namespace, table_no_ns, fqname = self.namespace_name(table)
+            out = sql.replace('%t', table).replace('%T', table_no_ns)
+            out = self.SQL[k] = UConDB.dollar_parameters(out)[0]
+        return out
+
+    async def fetch(self, table, sql, *args):
+        pool = await self.connect()
+        t0 = time.time()
+        rows = await pool.fetch(self.sql(table, sql), *args)
+        if self.Instrumentation is not None:
+            self.Instrumentation("sql", sql, table, args, time.time() - t0, len(rows), None)
+        return rows
+
+    async def fetchrow(self, table, sql, *args):
+        pool = await self.connect()
+        t0 = time.time()
+        row = await pool.fetchrow(self.sql(table, sql), *args)
+        if self.Instrumentation is not None:
+            self.Instrumentation("sql", sql, table, args, time.time() - t0, 0 if row is None else 1, None)
+        return row
+
+    async def fetchval(self, table, sql, *args):
+        pool = await self.connect()
+        t0 = time.time()
+        value = await pool.fetchval(self.sql(table, sql), *args)
+        if self.Instrumentation is not None:
+            self.Instrumentation("sql", sql, table, args, time.time() - t0, None, None)
+        return value
+
+    async def iterate(self, table, sql, *args):
+        # async generator of rows read with a server-side cursor
+        pool = await self.connect()
+        t0 = time.time()
+        nrows = 0
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor(self.sql(table, sql), *args, prefetch=self.CursorPrefetch):
+                    nrows += 1
+                    yield row
+        if self.Instrumentation is not None:
+            self.Instrumentation("sql", sql, table, args, time.time() - t0, nrows, None)
+
+    async def getData(self, folder_name, data_key):
+        await self.connect()
+        table_name = "%s_data" % (folder_name,)
+        t0 = time.time()
+        data = await self.DataPool.fetchval(f"select data from {table_name} where key = $1", int(data_key))
+        if self.Instrumentation is not None:
+            self.Instrumentation("data", "getData", folder_name, data_key, time.time() - t0, 
+                        0 if data is None else 1, 0 if data is None else len(data))
+        return None if data is None else bytes(data)
+
+    DataChunk = 100
+
+    async def getDataBulk(self, folder_name, data_keys):
+        # async generator of (data_key, blob) pairs. Missing blobs are not present in the output
+        await self.connect()
+        table_name = "%s_data" % (folder_name,)
+        keys = [int(k) for k in data_keys]
+        t0 = time.time()
+        nrows = nbytes = 0
+        for i in range(0, len(keys), self.DataChunk):
+            rows = await self.DataPool.fetch(f"select key, data from {table_name} where key = any($1::bigint[])", 
+                        keys[i:i+self.DataChunk])
+            for key, data in rows:
+                nrows += 1
+                nbytes += len(data)
+                yield str(key), bytes(data)
+        if self.Instrumentation is not None:
+            self.Instrumentation("data", "getDataBulk", folder_name, data_keys, time.time() - t0, nrows, nbytes)
+
+    async def folderTables(self, fqname):
+        tables = self.FolderCache.get(self.ConnStr, fqname)
+        if tables is None:
+            namespace, name = fqname.split(".", 1)
+            relnames = UCDFolder.relation_names(name)
+            pool = await self.connect()
+            rows = await pool.fetch("""select c.relname from pg_class c, pg_namespace n
+                        where n.oid = c.relnamespace and n.nspname = $1 and c.relkind in ('r', 'p', 'i', 'I')
+                            and c.relname = any($2::text[])""",
+                    namespace, list(relnames))
+            tables = set(relnames[row[0]] for row in rows)
+            self.FolderCache.put(self.ConnStr, fqname, tables)
+        return tables
+
+    async def getFolder(self, name):
+        UCDFolder.validate_name(name)
+        namespace, name, fqname = self.namespace_name(name)
+        tables = await self.folderTables(fqname)
+        if "versions" not in tables:
+            return None
+        return AsyncUCDFolder(self, fqname, tables)
+
+    def syncDB(self):
+        # synchronous UConDB used for writes, called in executor threads
+        if self.SyncPool is None:
+            self.SyncPool = ConnectionPool(postgres=self.ConnStr, idle_timeout=5)
+            self.SyncDataStorage = UCDPostgresDataStorage(ConnectionPool(postgres=self.DataConnStr, idle_timeout=5), 
+                        default_namespace=self.DataNamespace, instrumentation=self.Instrumentation)
+        return UConDB(self.SyncPool, self.SyncDataStorage, 
+                        default_namespace=self.DefaultNamespace, folder_cache=self.FolderCache,
+                        notify_channel=self.NotifyChannel, interval_index=self.IntervalIndex, instrumentation=self.Instrumentation)
+
+    async def runSync(self, method, *params, **args):
+        # runs method(sync_db, *params, **args) in the default executor with a synchronous UConDB
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: method(self.syncDB(), *params, **args))
+
+class AsyncUCDFolder:
+
+    def __init__(self, db, name, tables):
+        self.DB = db
+        self.Name = name
+        self.Tables = tables
+
+    def __str__(self):
+        return "AsyncUCDFolder(%s)" % (self.Name,)
+
+    def hasTable(self, suffix):
+        return suffix in self.Tables
+
+    def ready(self, suffix):
+        # True if the table exists and is not being built by an online migration, see UCDFolder.buildOnline
+        return self.hasTable(suffix) and not self.hasTable(suffix + "_backfill")
+
+    def createObject(self, name):
+        if not name:
+            raise ValueError("Object name is empty or None")
+        return AsyncUCDObject(self, name)
+
+    def version(self, o, row, tags_index):
+        vid, tr, tv, data_key, data_size, key, adler32 = row[:7]
+        return AsyncUCDVersion(o, vid, tr, tv, data_key, data_size, adler32, key=key, tags=list(row[tags_index]))
+
+    async def getObject(self, name):
+        if self.ready("objects"):
+            found = await self.DB.fetchval(self.Name, """select exists (select 1 from %t_objects where name=%s and version_count > 0)""", name)
+        else:
+            found = await self.DB.fetchval(self.Name, """select exists (select 1 from %t_versions where object=%s and not deleted)""", name)
+        return AsyncUCDObject(self, name) if found else None
+
+    async def objectCount(self):
+        if self.ready("objects"):
+            return await self.DB.fetchval(self.Name, """select count(*) from %t_objects where version_count > 0""")
+        else:
+            return await self.DB.fetchval(self.Name, """select count(distinct object) from %t_versions where not deleted""")
+
+    async def listObjects(self, limit=None, offset=None, begins_with=None):
+        if self.ready("objects"):
+            sql = """select name from %t_objects
+                    where version_count > 0 and (%s::text is null or name like (%s::text || '%%'))
+                    order by name limit %s::bigint offset %s::bigint"""
+        else:
+            sql = """select distinct object from %t_versions
+                    where not deleted and (%s::text is null or object like (%s::text || '%%'))
+                    order by object limit %s::bigint offset %s::bigint"""
+        rows = await self.DB.fetch(self.Name, sql, begins_with, begins_with, limit, offset)
+        return [AsyncUCDObject(self, row[0]) for row in rows]
+
+    async def getVersionByID(self, vid):
+        row = await self.DB.fetchrow(self.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}, v.object
+                from %t_versions v where v.id = %s""", vid)
+        if row is None: return None
+        return self.version(AsyncUCDObject(self, row[8]), row, 7)
+
+    async def getVersionsByIDs(self, ids):
+        objects = {}
+        async for row in self.DB.iterate(self.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}, v.object
+                    from %t_versions v where v.id = any(%s::int[])""", list(ids)):
+            name = row[8]
+            o = objects.get(name)
+            if o is None:
+                o = objects[name] = AsyncUCDObject(self, name)
+            yield self.version(o, row, 7)
+
+    async def resolveVersions(self, lookups, tag=None, tr=None):
+        # async generator of (object name, tv, AsyncUCDVersion), see UCDFolder.resolveVersions
+        tr = as_tr(tr)
+        names, tvs = [], []
+        for o, tv in lookups:
+            names.append(o if isinstance(o, str) else o.Name)
+            tvs.append(float(tv))
+        if not names:
+            return
+        objects = {}
+        async for row in self.DB.iterate(self.Name, f"""
+                select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}, q.object, q.tv
+                    from unnest(%s::text[], %s::float[]) with ordinality as q(object, tv, i)
+                    cross join lateral (
+                        select vv.id, vv.tr, vv.tv, vv.data_key, vv.data_size, vv.key, vv.adler32
+                            from %t_versions vv
+                            where vv.object = q.object and vv.tv <= q.tv
+                                and (%s::timestamptz is null or vv.tr < %s::timestamptz)
+                                and (%s::text is null or exists (
+                                        select 1 from %t_tags t
+                                            where t.version_id = vv.id and t.tag_name = %s::text
+                                    )
+                                )
+                            order by vv.tr desc, vv.tv desc
+                            limit 1
+                    ) v
+                    order by q.i""", names, tvs, tr, tr, tag, tag):
+            name = row[8]
+            o = objects.get(name)
+            if o is None:
+                o = objects[name] = AsyncUCDObject(self, name)
+            yield name, row[9], self.version(o, row, 7)
+
+    async def latestVersions(self, names=None):
+        if self.ready("latest"):
+            sql = f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}, v.object
+                    from %t_latest l, %t_versions v
+                    where v.id = l.version_id and (%s::text[] is null or l.object = any(%s::text[]))
+                    order by l.object"""
+        else:
+            sql = f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}, v.object
+                    from (
+                        select distinct on (object) * from %t_versions
+                            where not deleted and (%s::text[] is null or object = any(%s::text[]))
+                            order by object, tr desc, tv desc, id desc
+                    ) v
+                    order by v.object"""
+        async for row in self.DB.iterate(self.Name, sql, names, names):
+            yield self.version(AsyncUCDObject(self, row[8]), row, 7)
+
+    async def getDataByDataKey(self, data_key):
+        return await self.DB.getData(self.Name, data_key)
+
+    def getDataByDataKeys(self, data_keys):
+        return self.DB.getDataBulk(self.Name, data_keys)
+
+    async def createVersions(self, items, override_key=False, batch_size=1000):
+        items = list(items)
+        return await self.DB.runSync(lambda db: db.getFolder(self.Name).createVersions(items, override_key=override_key, batch_size=batch_size))
+
+class AsyncUCDObject:
+
+    __slots__ = ("Folder", "Name")
+
+    def __init__(self, folder, name):
+        self.Folder = folder
+        self.Name = name
+
+    def version(self, row):
+        vid, tr, tv, data_key, data_size, key, adler32, tags = row
+        return AsyncUCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=list(tags))
+
+    async def intervalIndex(self):
+        # returns UCDIntervalIndex shared with the synchronous API or None if the interval index is not enabled
+        cache = self.Folder.DB.IntervalIndex
+        if cache is None:
+            return None
+        index = cache.cached(self.Folder.Name, self.Name)
+        if index is None:
+            index = await self.Folder.DB.runSync(lambda db: cache.get(UCDObject(db.getFolder(self.Folder.Name), self.Name)))
+        return index
+
+    async def getVersion(self, tag=None, tr=None, tv=None, key=None):
+        db = self.Folder.DB
+        if key is not None:
+            row = await db.fetchrow(self.Folder.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s and v.key = %s""", self.Name, key)
+            return None if row is None else self.version(row)
+
+        tv = float(time.time() if tv is None else tv)
+        tr = as_tr(tr)
+        if tag is None:
+            index = await self.intervalIndex()
+            if index is not None:
+                e = index.lookup(tv, tr)
+                if e is None:   return None
+                tv, _, vid, tr, data_key, data_size, adler32, key = e
+                # tags are not kept in the index, AsyncUCDVersion can not load them lazily
+                tags = await db.fetchval(self.Folder.Name, """select coalesce(array_agg(tag_name order by tag_name), array[]::text[])
+                    from %t_tags where version_id = %s""", vid)
+                return AsyncUCDVersion(self, vid, tr, tv, data_key, data_size, adler32, key=key, tags=list(tags))
+
+        if tag is not None:
+            row = await db.fetchrow(self.Folder.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v, %t_tags t
+                where v.object = %s and v.tv <= %s and v.id = t.version_id and t.tag_name = %s
+                order by v.tr desc, v.tv desc
+                limit 1""", self.Name, tv, tag)
+        elif tr is not None:
+            row = await db.fetchrow(self.Folder.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s and v.tr < %s and v.tv <= %s
+                order by v.tr desc, v.tv desc
+                limit 1""", self.Name, tr, tv)
+        elif self.Folder.ready(UCDFolder.ValidityIndex):
+            row = await db.fetchrow(self.Folder.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s and (v.tv_end is null or v.tv_end > v.tv)
+                    and coalesce(v.tv_end, 'infinity'::float) > %s and v.tv <= %s
+                order by coalesce(v.tv_end, 'infinity'::float)
+                limit 1""", self.Name, tv, tv)
+        else:
+            row = await db.fetchrow(self.Folder.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s and v.tv <= %s
+                order by v.tr desc, v.tv desc
+                limit 1""", self.Name, tv)
+        return None if row is None else self.version(row)
+
+    async def listVersions(self, tr=None, tv=None, tr_since=None, tag=None, limit=None, offset=None, after=None):
+        # async generator, same ordering and paging as UCDObject.listVersions
+        after_tr = after_tv = after_id = None
+        if after is not None:
+            after_tr, after_tv, after_id = parse_page_token(after)
+        sql = f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where not v.deleted and v.object = %s
+                    and (%s::text is null or exists (select 1 from %t_tags t where t.version_id = v.id and t.tag_name = %s::text))
+                    and (%s::timestamptz is null or v.tr > %s::timestamptz)
+                    and (%s::float is null or v.tv <= %s::float)
+                    and (%s::timestamptz is null or v.tr <= %s::timestamptz)
+                    and v.tr <= coalesce(%s::timestamptz, 'infinity'::timestamptz)
+                    and (%s::timestamptz is null or v.tr < %s::timestamptz
+                            or v.tr = %s::timestamptz and (v.tv, v.id) > (%s::float, %s::int))
+                order by v.tr desc, v.tv, v.id
+                limit %s::bigint offset %s::bigint"""
+        tr_since, tr, after_tr = as_tr(tr_since), as_tr(tr), as_tr(after_tr)
+        tv = None if tv is None else float(tv)
+        async for row in self.Folder.DB.iterate(self.Folder.Name, sql, self.Name, tag, tag, tr_since, tr_since, tv, tv, tr, tr,
+                            after_tr, after_tr, after_tr, after_tr, after_tv, after_id, limit, offset):
+            yield self.version(row)
+
+    async def getVersionsForInterval(self, tv0, tv1, tag=None, tr=None):
+        # async generator, see UCDObject.getVersionsForInterval
+        tr = as_tr(tr)
+        db = self.Folder.DB
+        if tag is None and tr is None and self.Folder.ready(UCDFolder.ValidityIndex):
+            rows = db.iterate(self.Folder.Name, f"""
+                select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                    from %t_versions v
+                    where v.object = %s and (v.tv_end is null or v.tv_end > v.tv)
+                        and coalesce(v.tv_end, 'infinity'::float) > %s and v.tv <= %s
+                    order by v.tv""", self.Name, float(tv0), float(tv1))
+        else:
+            rows = db.iterate(self.Folder.Name, f"""
+                with effective as (
+                    select id, key, tr, tv, data_key, data_size, adler32 from (
+                        select v.id, v.key, v.tr, v.tv, v.data_key, v.data_size, v.adler32,
+                                min(v.tv) over (order by v.tr desc, v.tv desc, v.id desc
+                                                rows between unbounded preceding and 1 preceding) as min_later_tv
+                            from %t_versions v
+                            where not v.deleted and v.object = %s and v.tv <= %s::float
+                                and (%s::timestamptz is null or v.tr < %s::timestamptz)
+                                and (%s::text is null or exists (
+                                        select 1 from %t_tags t
+                                            where t.version_id = v.id and t.tag_name = %s::text
+                                    )
+                                )
+                    ) candidates
+                    where min_later_tv is null or tv < min_later_tv
+                )
+                select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn} from (
+                        (select * from effective where tv <= %s::float order by tv desc limit 1)
+                        union all
+                        select * from effective where tv > %s::float
+                    ) v
+                    order by v.tv""", self.Name, float(tv1), tr, tr, tag, tag, float(tv0), float(tv0))
+        async for row in rows:
+            yield self.version(row)
+
+    async def getVersionsByKeys(self, keys=None, key_min=None, key_max=None):
+        # async generator, see UCDObject.getVersionsByKeys
+        if keys:
+            rows = self.Folder.DB.iterate(self.Folder.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s and v.key = any(%s::text[])""", self.Name, list(keys))
+        else:
+            rows = self.Folder.DB.iterate(self.Folder.Name, f"""select v.id, v.tr, v.tv, v.data_key, v.data_size, v.key, v.adler32, {TagsColumn}
+                from %t_versions v
+                where v.object = %s
+                    and (%s::text is null or v.key >= %s::text)
+                    and (%s::text is null or v.key < %s::text)""", self.Name, key_min, key_min, key_max, key_max)
+        async for row in rows:
+            yield self.version(row)
+
+    async def getVersionsByTvs(self, tvs, tag=None, tr=None):
+        # async generator of (tv, AsyncUCDVersion) pairs sorted by tv, see UCDObject.getVersionsByTvs
+        tvs = sorted(tvs)
+        if not tvs:
+            return
+        it = 0
+        prev_v = None
+        async for v in self.getVersionsForInterval(tvs[0], tvs[-1], tag=tag, tr=tr):
+            while it < len(tvs) and tvs[it] < v.Tv:
+                if prev_v is not None:
+                    yield tvs[it], prev_v
+                it += 1
+            prev_v = v
+        if prev_v is not None:
+            while it < len(tvs):
+                yield tvs[it], prev_v
+                it += 1
+
+    async def createVersion(self, data, tv=None, key=None, tags=[], override_key=False):
+        data = to_bytes(data)
+        name = self.Name
+        v = await self.Folder.DB.runSync(lambda db: db.getFolder(self.Folder.Name).createObject(name)
+                                            .createVersion(data, tv=tv, key=key, tags=tags, override_key=override_key))
+        out = AsyncUCDVersion(self, v.ID, v.Tr, v.Tv, v.DataKey, v.DataSize, v.Adler32, key=v.Key, tags=sorted(set(tags)))
+        out.Data = data
+        return out
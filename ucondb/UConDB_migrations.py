@@ -0,0 +1,268 @@
+#
+# Schema versions and online migrations of existing folders
+#
+# The schema version of a folder is the number of migrations from UCDSchemaMigrator.Migrations applied to it.
+# Versions are recorded in the ucondb_schema table of the folder namespace. For folders not recorded there,
+# the version is found by checking which migrations were applied already.
+# All migrations run online: tables are filled in batches of objects (see UCDFolder.buildOnline) and indexes are built
+# with "create index concurrently", so the folder can be read and written while it is migrated.
+#
+
+import time
+from threading import Thread, Event
+from .UConDB import UCDFolder
+
+class UCDMigration(object):
+    #
+    # Subclasses define applied(folder) and apply(folder, grants={}, progress=None),
+    # progress is callable(phase, done, total)
+    #
+
+    def __init__(self, description):
+        self.Description = description
+
+class UCDFolderMethodMigration(UCDMigration):
+    #
+    # Migration done by an online UCDFolder method, see UCDFolder.buildOnline. It is applied when the table is complete
+    #
+
+    def __init__(self, description, suffix, method, with_grants=True):
+        UCDMigration.__init__(self, description)
+        self.Suffix = suffix
+        self.Method = method
+        self.WithGrants = with_grants
+
+    def applied(self, folder):
+        return folder.ready(self.Suffix)
+
+    def apply(self, folder, grants={}, progress=None):
+        method = getattr(folder, self.Method)
+        if self.WithGrants:
+            method(grants, progress=progress)
+        else:
+            method(progress=progress)
+
+class IndexBuildMonitor(Thread):
+    #
+    # Reports progress of "create index" running in the backend with given pid, uses its own database connection
+    #
+
+    def __init__(self, db, pid, progress, interval=5):
+        Thread.__init__(self, daemon=True)
+        self.DB = db
+        self.PID = pid
+        self.Progress = progress
+        self.Interval = interval
+        self.Stop = Event()
+
+    def run(self):
+        try:
+            c = self.DB.cursor()
+            while not self.Stop.wait(self.Interval):
+                c.execute("""select phase, blocks_done, blocks_total, tuples_done, tuples_total
+                                from pg_stat_progress_create_index where pid = %s""", (self.PID,))
+                tup = c.fetchone()
+                c.execute("rollback")
+                if tup is not None:
+                    phase, blocks_done, blocks_total, tuples_done, tuples_total = tup
+                    if blocks_total:
+                        self.Progress(phase, blocks_done, blocks_total)
+                    else:
+                        self.Progress(phase, tuples_done, tuples_total)
+        except Exception:
+            pass            # pg_stat_progress_create_index is available in Postgres 12 and later
+        finally:
+            self.DB.disconnect()
+
+    def stop(self):
+        self.Stop.set()
+        self.join()
+
+class UCDIndexMigration(UCDMigration):
+    #
+    # Builds index <folder>_<index> on <folder>_<table> with "create index concurrently".
+    # Indexes of partitioned tables are built concurrently on each partition and attached to the index created
+    # on the partitioned table. Interrupted migrations can be restarted.
+    #
+
+    def __init__(self, description, table, index, definition):
+        UCDMigration.__init__(self, description)
+        self.Table = table                  # table suffix
+        self.Index = index                  # index suffix
+        self.Definition = definition        # e.g. "(object, tr)" or "using brin (tr)"
+
+    @staticmethod
+    def index_state(c, namespace, name):
+        # returns None if the index does not exist, otherwise True if it is valid
+        c.execute("""select i.indisvalid from pg_index i, pg_class c, pg_namespace n
+                        where c.oid = i.indexrelid and n.oid = c.relnamespace and n.nspname = %s and c.relname = %s""",
+                    (namespace, name))
+        tup = c.fetchone()
+        return None if tup is None else tup[0]
+
+    @staticmethod
+    def partitions(c, namespace, table):
+        # returns list of partition names or None if the table is not partitioned
+        c.execute("""select c.relkind = 'p' from pg_class c, pg_namespace n
+                        where n.oid = c.relnamespace and n.nspname = %s and c.relname = %s""", (namespace, table))
+        tup = c.fetchone()
+        if tup is None or not tup[0]:
+            return None
+        c.execute("""select c.relname from pg_inherits i, pg_class c
+                        where c.oid = i.inhrelid and i.inhparent = %s::regclass
+                        order by c.relname""", (f"{namespace}.{table}",))
+        return [name for (name,) in c.fetchall()]
+
+    def applied(self, folder):
+        namespace, name, _ = folder.DB.namespace_name(folder.Name)
+        c = folder.DB.cursor()
+        valid = self.index_state(c, namespace, f"{name}_{self.Index}")
+        c.execute("rollback")
+        return bool(valid)
+
+    def build(self, c, db, progress, sql):
+        monitor = None
+        if progress is not None and db.Conn is None:
+            monitor = IndexBuildMonitor(db, c.connection.get_backend_pid(), progress)
+            monitor.start()
+        try:
+            c.execute(sql)
+        finally:
+            if monitor is not None:
+                monitor.stop()
+
+    def apply(self, folder, grants={}, progress=None):
+        db = folder.DB
+        namespace, name, _ = db.namespace_name(folder.Name)
+        table = f"{name}_{self.Table}"
+        index = f"{name}_{self.Index}"
+        conn = db.connect()
+        conn.commit()
+        conn.autocommit = True          # create index concurrently can not run in a transaction
+        try:
+            c = conn.cursor()
+            partitions = self.partitions(c, namespace, table)
+            if partitions is None:
+                if self.index_state(c, namespace, index) is False:
+                    # left by interrupted migration
+                    c.execute(f"drop index concurrently {namespace}.{index}")
+                self.build(c, db, progress,
+                    f"create index concurrently if not exists {index} on {namespace}.{table} {self.Definition}")
+            else:
+                c.execute(f"create index if not exists {index} on only {namespace}.{table} {self.Definition}")
+                # e.g. <folder>_versions_h0_object_tr_inx for <folder>_versions_object_tr_inx
+                suffix = self.Index[len(self.Table)+1:] if self.Index.startswith(self.Table + "_") else self.Index
+                for i, partition in enumerate(partitions):
+                    # partitions created after the index on the partitioned table get their indexes attached automatically
+                    c.execute("""select exists (select 1 from pg_inherits h, pg_index x
+                                    where h.inhparent = %s::regclass and x.indexrelid = h.inhrelid 
+                                        and x.indrelid = %s::regclass)""",
+                            (f"{namespace}.{index}", f"{namespace}.{partition}"))
+                    if not c.fetchone()[0]:
+                        partition_index = f"{partition}_{suffix}"
+                        state = self.index_state(c, namespace, partition_index)
+                        if state is False:
+                            c.execute(f"drop index concurrently {namespace}.{partition_index}")
+                        if not state:
+                            self.build(c, db, progress,
+                                f"create index concurrently {partition_index} on {namespace}.{partition} {self.Definition}")
+                        c.execute(f"alter index {namespace}.{index} attach partition {namespace}.{partition_index}")
+                    if progress is not None:
+                        progress("partitions", i + 1, len(partitions))
+        finally:
+            conn.autocommit = False
+
+class UCDSchemaMigrator(object):
+
+    Migrations = [
+        UCDFolderMethodMigration("objects catalog", "objects", "createObjectsCatalog"),
+        UCDFolderMethodMigration("latest versions table", "latest", "createLatestTable"),
+        UCDFolderMethodMigration("validity intervals index", UCDFolder.ValidityIndex, "createValidityIndex", with_grants=False),
+        UCDIndexMigration("tags by name index", "tags", "tags_name_inx", "(tag_name, version_id)"),
+        UCDIndexMigration("versions by object and tr index", "versions", "versions_object_tr_inx", "(object, tr)"),
+        UCDIndexMigration("versions tr BRIN index", "versions", "versions_tr_brin", "using brin (tr)"),
+        UCDIndexMigration("versions paging index", "versions", "versions_page_inx", "(object, tr desc, tv, id)")
+    ]
+
+    CreateSchemaTable = """
+        create table if not exists {namespace}.ucondb_schema
+        (
+            folder      text    primary key,
+            version     int,
+            updated     timestamp with time zone default current_timestamp
+        )"""
+
+    def __init__(self, db, grants={}, migrations=None):
+        self.DB = db
+        self.Grants = grants            # grants for the tables created by the migrations, {'r':[...], 'w':[...]}
+        if migrations is not None:
+            self.Migrations = migrations
+
+    def latestVersion(self):
+        return len(self.Migrations)
+
+    def recordedVersions(self, namespace):
+        # returns {folder name: recorded schema version}
+        c = self.DB.cursor()
+        c.execute("select to_regclass(%s) is not null", (f"{namespace}.ucondb_schema",))
+        versions = {}
+        if c.fetchone()[0]:
+            c.execute(f"select folder, version from {namespace}.ucondb_schema")
+            versions = dict(c.fetchall())
+        c.execute("rollback")
+        return versions
+
+    def schemaVersion(self, folder, recorded=None):
+        namespace, name, _ = self.DB.namespace_name(folder.Name)
+        if recorded is None:
+            recorded = self.recordedVersions(namespace)
+        version = recorded.get(name)
+        if version is None:
+            version = 0
+            for m in self.Migrations:
+                if not m.applied(folder):
+                    break
+                version += 1
+        return version
+
+    def setSchemaVersion(self, folder, version):
+        namespace, name, _ = self.DB.namespace_name(folder.Name)
+        c = self.DB.cursor()
+        c.execute(self.CreateSchemaTable.format(namespace=namespace))
+        c.execute(f"""insert into {namespace}.ucondb_schema(folder, version) values (%s, %s)
+                        on conflict (folder) do update set version = excluded.version, updated = current_timestamp""",
+                    (name, version))
+        c.execute("commit")
+
+    def outdatedFolders(self, namespace):
+        # returns list of (folder, schema version) for folders with schema version older than the latest
+        recorded = self.recordedVersions(namespace)
+        out = []
+        for folder in self.DB.listFolders(namespace):
+            version = self.schemaVersion(folder, recorded)
+            if version < self.latestVersion():
+                out.append((folder, version))
+        return out
+
+    def migrate(self, folder, target=None, progress=None):
+        #
+        # applies the migrations to bring the folder to the target schema version, default: the latest
+        # progress: callable(folder name, migration description, phase, done, total)
+        # returns the new schema version
+        #
+        target = self.latestVersion() if target is None else target
+        version = self.schemaVersion(folder)
+        for i in range(version, target):
+            m = self.Migrations[i]
+            report = None
+            if progress is not None:
+                report = lambda phase, done, total, m=m: progress(folder.Name, m.Description, phase, done, total)
+                report("start", i, target)
+            if not m.applied(folder):
+                t0 = time.time()
+                m.apply(folder, self.Grants, report)
+                if report is not None:
+                    report("done in %.1f seconds" % (time.time() - t0,), i + 1, target)
+            self.setSchemaVersion(folder, i + 1)
+            version = i + 1
+        return version
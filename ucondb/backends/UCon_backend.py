@@ -16,6 +16,8 @@ class DataLoaderTask(Task):
 
 class UCDataStorageBase:
     # abstract base class
+
+    Instrumentation = None      # hook called by getData/putData methods, see tools/instrumentation.py
     
     def __init__(self, *params, **args):
         raise ValueError("UCDataStorageBase is an abstract class and can not be instantiated")
@@ -31,6 +33,10 @@ class UCDataStorageBase:
         # returns data key, text
         return None     
     
+    def putDataBulk(self, folder_name, blobs):
+        # returns list of data keys in the same order as blobs
+        return [self.putData(folder_name, data) for data in blobs]
+    
     
     
     def getDataBulk(self, folder_name, data_keys):
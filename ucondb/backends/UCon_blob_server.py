@@ -1,6 +1,7 @@
 from datetime import datetime
 from pythreader import PyThread, Primitive, Task, TaskQueue, DEQueue
 from UCon_backend import UCDataStorageBase
+from instrumentation import instrumented
 from py3 import to_str, to_bytes
 import requests
 
@@ -14,6 +15,7 @@ class UCDBlobStorage(UCDataStorageBase):
     def createFolder(self, name, owner, grants, drop_existing=False):
         pass
 
+    @instrumented
     def putData(self, folder_name, data):        
         size = len(data)
         url = f"{self.URL}/blob?size={size}"
@@ -23,6 +25,7 @@ class UCDBlobStorage(UCDataStorageBase):
         else:
             raise RuntimeError(f"HTTP error: {respinse.status_code}\n" + response.text)
                    
+    @instrumented
     def getData(self, folder_name, key):
         url = f"{self.URL}/blob?{key}"
         response = requests.get(url)
@@ -8,6 +8,7 @@ from couchbase.bucket import Bucket
 from couchbase.cluster import Cluster, PasswordAuthenticator
 from couchbase.exceptions import NotFoundError, TemporaryFailError
 from UCon_backend import UCDataStorageBase
+from instrumentation import instrumented
 
 class UCDCouchBaseDataStorage(UCDataStorageBase):
 
@@ -47,6 +48,7 @@ class UCDCouchBaseDataStorage(UCDataStorageBase):
         rv = b.counter(k)
         return rv.value
         
+    @instrumented
     def putData(self, folder_name, data):
         data_id = self.nextDataID(folder_name)
         key = self.dataKey(folder_name, data_id)
@@ -96,6 +98,7 @@ class UCDCouchBaseDataStorage(UCDataStorageBase):
                 value = ''.join(chunks)
         return value
 
+    @instrumented
     def getData(self, folder_name, key_or_keys):
         if isinstance(key_or_keys, list):
             return ((key, self._get_data(folder_name, key)) for key in key_or_keys)
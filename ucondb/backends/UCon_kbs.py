@@ -4,6 +4,7 @@ from requests.auth import HTTPDigestAuth
 
 from dbdig import DbDig
 from UCon_backend import UCDataStorageBase
+from instrumentation import instrumented
 from py3 import to_str, to_bytes
 
 class UCDKBSDataStorage(UCDataStorageBase):
@@ -13,6 +14,7 @@ class UCDKBSDataStorage(UCDataStorageBase):
         self.Username = username
         self.Password = password
 
+    @instrumented
     def putData(self, folder_name, data):
         data = to_bytes(data)
         response = requests.put(self.URL + "/put", data=data, auth=HTTPDigestAuth(self.Username, self.Password))
@@ -21,6 +23,7 @@ class UCDKBSDataStorage(UCDataStorageBase):
         else:
             raise ValueError(f"HTTP status code {response.status_code}")
                    
+    @instrumented
     def getData(self, folder_name, key):
         response = requests.get(self.URL + f"/get/{key}")
         if response.status_code//100 == 2:
@@ -7,7 +7,7 @@ from wsdbtools import ConnectionPool
 #import cStringIO
 
 #from trace import Tracer
-from ucondb.tools import DbDig, to_str, to_bytes
+from ucondb.tools import DbDig, to_str, to_bytes, namespace_cursor, instrumented
 from .UCon_backend import UCDataStorageBase
 
 def cursor_generator(c):
@@ -19,8 +19,9 @@ def cursor_generator(c):
         
 class DataLoaderTask(Task):
     
-    def __init__(self, connection_pool, table_name, data_keys, out_queue):
+    def __init__(self, connection_pool, table_name, data_keys, out_queue, namespace=None):
         Task.__init__(self)
+        self.Namespace = namespace
         self.ConnectionPool = connection_pool
         self.DataKeys = data_keys
         self.TableName = table_name
@@ -29,7 +30,7 @@ class DataLoaderTask(Task):
     def run(self):
         connection = self.ConnectionPool.connect()
         table_name = self.TableName
-        c = connection.cursor()
+        c = namespace_cursor(connection, self.Namespace)
         sql = f"""
             select key, data from {self.TableName}
                 where key = any(%s)"""
@@ -43,7 +44,7 @@ class DataLoaderTask(Task):
 
 class UCDPostgresDataStorage(UCDataStorageBase):
 
-    def __init__(self, conn_or_connstr, default_namespace=None, detect_duplicates = True):
+    def __init__(self, conn_or_connstr, default_namespace=None, detect_duplicates = True, instrumentation=None):
         self.Conn = self.ConnStr = self.ConnPool = None
         if isinstance(conn_or_connstr, str):
             self.ConnStr = conn_or_connstr
@@ -54,6 +55,9 @@ class UCDPostgresDataStorage(UCDataStorageBase):
             self.Conn = conn_or_connstr
         self.DetectDuplicates = detect_duplicates
         self.DefaultNamespace = default_namespace
+        self.SameDatabase = None                # unknown until sameDatabase() is called
+        if instrumentation is not None:
+            self.Instrumentation = instrumentation
 
     def connect(self):
         if self.ConnPool is not None:
@@ -62,15 +66,37 @@ class UCDPostgresDataStorage(UCDataStorageBase):
             return self.Conn
     
     def cursor(self):
-        conn = self.connect()
-        c = conn.cursor()
-        if self.DefaultNamespace:
-            c.execute(f"set schema '{self.DefaultNamespace}'")
-        return c
+        return namespace_cursor(self.connect(), self.DefaultNamespace)
 
     def tableName(self, folder_name):
         return "%s_data" % (folder_name,)
 
+    def qualifiedTableName(self, folder_name):
+        # table name usable from a connection with a different search_path
+        table_name = self.tableName(folder_name)
+        if "." not in table_name and self.DefaultNamespace:
+            table_name = "%s.%s" % (self.DefaultNamespace, table_name)
+        return table_name
+
+    ServerIdentity = "select current_database(), inet_server_addr(), inet_server_port(), current_user, current_schema()"
+
+    def sameDatabase(self, conn):
+        # True if the data tables are in the same database as the one the connection is connected to
+        if self.SameDatabase is None:
+            c = self.cursor()
+            c.execute(self.ServerIdentity)
+            mine = c.fetchone()
+            c.execute("rollback")
+            c = conn.cursor()
+            c.execute(self.ServerIdentity)
+            theirs = c.fetchone()
+            # the fused statement writes the data table with the metadata connection, so the user must match to keep 
+            # the data storage permissions. Without the default namespace, the data table names are resolved 
+            # with the search_path, which must match too
+            n = 4 if self.DefaultNamespace else 5
+            self.SameDatabase = mine[:n] == theirs[:n]
+        return self.SameDatabase
+
     def createFolder(self, name, owner, grants, drop_existing=False):
         c = self.cursor()
         table_name = self.tableName(name)
@@ -111,6 +137,7 @@ class UCDPostgresDataStorage(UCDataStorageBase):
         #c.execute("commit")
         
 
+    @instrumented
     def putData(self, folder_name, data):        
         data = to_bytes(data)
         a32 = zlib.adler32(data) & 0xFFFFFFFF
@@ -145,6 +172,45 @@ class UCDPostgresDataStorage(UCDataStorageBase):
                 c.execute("commit")
         return str(key)
                    
+    @instrumented
+    def putDataBulk(self, folder_name, blobs):
+        # returns list of data keys in the same order as blobs
+        blobs = [to_bytes(data) for data in blobs]
+        if not blobs:
+            return []
+        table_name = self.tableName(folder_name)
+        hashes = [zlib.adler32(data) & 0xFFFFFFFF for data in blobs]
+        sizes = [len(data) for data in blobs]
+        keys = [None] * len(blobs)
+        c = self.cursor()
+        if self.DetectDuplicates:
+            c.execute(f"""
+                select d.key, d.data from {table_name} d, unnest(%s::bigint[], %s::bigint[]) as h(hash, size)
+                    where d.hash = h.hash and d.size = h.size""", (hashes, sizes))
+            existing = {bytes(d):str(k) for k, d in cursor_generator(c)}
+            keys = [existing.get(data) for data in blobs]
+
+        new_blobs = {}          # data -> [indexes], identical blobs in the batch are stored once
+        for i, (key, data) in enumerate(zip(keys, blobs)):
+            if key is None:
+                new_blobs.setdefault(data, []).append(i)
+        if new_blobs:
+            inxs = list(new_blobs.values())
+            c.execute(f"select nextval('{table_name}_key_seq') from generate_series(1, %s)", (len(inxs),))
+            new_keys = [k for (k,) in c.fetchall()]
+            c.execute(f"""
+                insert into {table_name}(key, size, hash, data)
+                    select * from unnest(%s::bigint[], %s::bigint[], %s::bigint[], %s::bytea[])""",
+                (new_keys, [sizes[lst[0]] for lst in inxs], [hashes[lst[0]] for lst in inxs], 
+                    [psycopg2.Binary(blobs[lst[0]]) for lst in inxs])
+            )
+            c.execute("commit")
+            for key, lst in zip(new_keys, inxs):
+                for i in lst:
+                    keys[i] = str(key)
+        return keys
+                   
+    @instrumented
     def getData(self, folder_name, key):
         table_name = self.tableName(folder_name)
         c = self.cursor()
@@ -162,16 +228,25 @@ class UCDPostgresDataStorage(UCDataStorageBase):
     KEYS_PER_TASK = 100
     OUT_QUEUE_SIZE = 100
     
+    @instrumented
     def getDataBulk(self, folder_name, keys):
         table_name = self.tableName(folder_name)
-        assert self.ConnPool is not None
+        if self.ConnPool is None:
+            # single connection, load sequentially
+            keys = [int(k) for k in keys]
+            c = self.cursor()
+            for i in range(0, len(keys), self.KEYS_PER_TASK):
+                c.execute(f"select key, data from {table_name} where key = any(%s)", (keys[i:i+self.KEYS_PER_TASK],))
+                for key, data in c.fetchall():
+                    yield str(key), data
+            return
         
         task_queue = TaskQueue(self.MAX_CONNECTIONS)
         out_queue = DEQueue(capacity=self.OUT_QUEUE_SIZE)
         keys = [int(k) for k in keys]
         n = len(keys)
         for i in range(0, n, self.KEYS_PER_TASK):
-            t = DataLoaderTask(self.ConnPool, table_name, keys[i:i+self.KEYS_PER_TASK], out_queue)
+            t = DataLoaderTask(self.ConnPool, table_name, keys[i:i+self.KEYS_PER_TASK], out_queue, self.DefaultNamespace)
             task_queue << t
         
         while not task_queue.isEmpty():
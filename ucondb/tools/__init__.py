@@ -1,3 +1,5 @@
 from .dbdig import DbDig
 from .py3 import PY3, to_str, to_bytes
 from .timelib import text2datetime, UTC, ShiftTZ, fromepoch, epoch
+from .connections import namespace_cursor, physical_connection
+from .instrumentation import QueryStats, Histogram, instrumented
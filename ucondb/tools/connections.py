@@ -0,0 +1,41 @@
+import weakref
+from threading import RLock
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+#
+# Namespace (search_path) set on each connection, shared by all users of the connection
+# so that the schema is set once per connection instead of once per cursor
+#
+SearchPaths = weakref.WeakKeyDictionary()       # {physical connection: namespace}
+SearchPathsLock = RLock()
+
+def physical_connection(conn, c):
+    # connection pools hand out a new wrapper object on each connect(), the cursor refers to the underlying
+    # psycopg2 connection, which keeps the session state
+    return getattr(c, "connection", None) or conn
+
+def namespace_cursor(conn, namespace):
+    # returns new cursor of the connection with search_path set to the namespace
+    c = conn.cursor()
+    if not namespace:
+        return c
+    key = physical_connection(conn, c)
+    with SearchPathsLock:
+        try:    current = SearchPaths.get(key)
+        except TypeError:
+            current = None          # connection is not weak-referenceable, set the schema every time
+    if current == namespace:
+        return c
+    try:    idle = conn.autocommit or conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+    except AttributeError:
+        idle = False
+    c.execute(f"set schema '{namespace}'")
+    if idle:
+        # commit so that the setting survives rollbacks of later transactions
+        if not conn.autocommit:
+            c.execute("commit")
+        with SearchPathsLock:
+            try:    SearchPaths[key] = namespace
+            except TypeError:
+                pass
+    return c
@@ -0,0 +1,157 @@
+import time, math, logging
+from threading import RLock
+
+#
+# Query instrumentation
+#
+# UConDB.execute, UConDB.executePrepared and the data storage get/put methods call the instrumentation hook,
+# if set, after each query:
+#
+#   hook(kind, template, folder, params, elapsed, rows, nbytes)
+#
+#       kind        - "sql", "prepared" or "data"
+#       template    - SQL text before the folder name substitution, prepared query id or storage method name
+#       folder      - folder name or None
+#       params      - query parameters or data keys
+#       elapsed     - seconds
+#       rows        - rows returned or affected, number of blobs for data storage, None if unknown
+#       nbytes      - bytes of data transferred, None if unknown
+#
+# QueryStats is the hook which collects per-template histograms and logs slow queries.
+#
+
+class Histogram(object):
+    #
+    # Histogram with logarithmic bins, each bin covers [base**(i-1), base**i)
+    #
+
+    def __init__(self, base=2.0):
+        self.Base = base
+        self.LogBase = math.log(base)
+        self.Bins = {}          # {i: count}
+        self.Count = 0
+        self.Sum = 0.0
+        self.Max = None
+
+    def add(self, x):
+        i = None if x <= 0 else math.ceil(math.log(x)/self.LogBase)
+        self.Bins[i] = self.Bins.get(i, 0) + 1
+        self.Count += 1
+        self.Sum += x
+        self.Max = x if self.Max is None else max(self.Max, x)
+
+    def upper(self, i):
+        return 0 if i is None else self.Base**i
+
+    def percentile(self, p):
+        # returns upper bound of the bin with the p-th percentile, p in [0,100]
+        if not self.Count:
+            return None
+        n = 0
+        for i in sorted(self.Bins.keys(), key=lambda i: -math.inf if i is None else i):
+            n += self.Bins[i]
+            if n*100.0 >= p*self.Count:
+                return min(self.upper(i), self.Max)
+        return self.Max
+
+    def as_jsonable(self):
+        return {
+            "count":    self.Count,
+            "sum":      self.Sum,
+            "mean":     self.Sum/self.Count if self.Count else None,
+            "max":      self.Max,
+            "p50":      self.percentile(50),
+            "p90":      self.percentile(90),
+            "p99":      self.percentile(99),
+            "bins":     [(self.upper(i), n) for i, n in sorted(self.Bins.items(), key=lambda x: -math.inf if x[0] is None else x[0])]
+        }
+
+class QueryStats(object):
+
+    def __init__(self, slow_threshold=None, logger=None, max_params_length=200):
+        self.SlowThreshold = slow_threshold         # seconds, None - do not log slow queries
+        self.Logger = logger or logging.getLogger("ucondb.slow_queries")
+        self.MaxParamsLength = max_params_length
+        self.Stats = {}             # {(kind, template): {"latency": Histogram, "rows": Histogram, "bytes": Histogram}}
+        self.Lock = RLock()
+
+    def __call__(self, kind, template, folder, params, elapsed, rows=None, nbytes=None):
+        key = (kind, template)
+        with self.Lock:
+            stats = self.Stats.get(key)
+            if stats is None:
+                stats = self.Stats[key] = {"latency": Histogram(), "rows": Histogram(), "bytes": Histogram()}
+            stats["latency"].add(elapsed)
+            if rows is not None and rows >= 0:
+                stats["rows"].add(rows)
+            if nbytes is not None:
+                stats["bytes"].add(nbytes)
+        if self.SlowThreshold is not None and elapsed >= self.SlowThreshold:
+            params = repr(params)
+            if len(params) > self.MaxParamsLength:
+                params = params[:self.MaxParamsLength] + "..."
+            self.Logger.warning("slow %s query: %.3f seconds, folder: %s, rows: %s, bytes: %s, template: %s, params: %s",
+                kind, elapsed, folder, rows, nbytes, " ".join(template.split()), params)
+
+    def report(self):
+        # returns list of per-template statistics sorted by total time, the longest first
+        with self.Lock:
+            out = [
+                {
+                    "kind":     kind,
+                    "template": " ".join(template.split()),
+                    "latency":  stats["latency"].as_jsonable(),
+                    "rows":     stats["rows"].as_jsonable(),
+                    "bytes":    stats["bytes"].as_jsonable()
+                }
+                for (kind, template), stats in self.Stats.items()
+            ]
+        return sorted(out, key=lambda x: -x["latency"]["sum"])
+
+    def reset(self):
+        with self.Lock:
+            self.Stats = {}
+
+def instrumented(method):
+    #
+    # decorator for data storage methods: method(self, folder_name, data or data keys)
+    # calls self.Instrumentation hook, if set, with kind="data" and template=method name
+    #
+    name = method.__name__
+    is_put = name.startswith("put")
+    is_bulk = name.endswith("Bulk")
+
+    def blob_size(data):
+        return len(data) if isinstance(data, (bytes, bytearray, memoryview, str)) else 0
+
+    def generator(self, folder_name, arg, hook, t0):
+        rows = nbytes = 0
+        for key, data in method(self, folder_name, arg):
+            rows += 1
+            nbytes += blob_size(data)
+            yield key, data
+        hook("data", name, folder_name, arg, time.time() - t0, rows, nbytes)
+
+    def wrapper(self, folder_name, arg):
+        hook = self.Instrumentation
+        if hook is None:
+            return method(self, folder_name, arg)
+        t0 = time.time()
+        if is_bulk and not is_put:
+            return generator(self, folder_name, arg, hook, t0)
+        out = method(self, folder_name, arg)
+        if is_put:
+            params = None
+            if is_bulk:
+                rows, nbytes = len(arg), sum(blob_size(data) for data in arg)
+            else:
+                rows, nbytes = 1, blob_size(arg)
+        else:
+            params = arg
+            rows, nbytes = (0, 0) if out is None else (1, blob_size(out))
+        hook("data", name, folder_name, params, time.time() - t0, rows, nbytes)
+        return out
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
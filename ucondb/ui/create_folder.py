@@ -17,6 +17,7 @@ options:
     -o <table owner>
     -R <user>,...   - DB users to grant read permissions to
     -W <user>,...   - DB users to grant write permissions to
+    -P <partitioning> - partition the versions table: tr:month, tr:year or object:<number of partitions>
 """
 
 host = None
@@ -30,7 +31,7 @@ owner = None
 
 dbcon = []
 
-opts, args = getopt(sys.argv[1:], 'h:U:w:p:co:R:W:')
+opts, args = getopt(sys.argv[1:], 'h:U:w:p:co:R:W:P:')
 
 if len(args) < 2 or args[0] == 'help':
     print(Usage)
@@ -46,6 +47,7 @@ drop_existing = "-c" in opts
 grants_r = opts.get("-R","").split(",")
 grants_w = opts.get("-W","").split(",")
 owner = opts.get("-o")
+partitioning = opts.get("-P")
 
 dbcon.append("dbname=%s" % (args[0],))
 
@@ -55,7 +57,8 @@ fname = args[1]
 ds = UCDPostgresDataStorage(dbcon)
 db = UConDB(dbcon, ds)
 
-f = db.createFolder(fname, owner=owner, grants = {'r':grants_r, 'w':grants_w}, drop_existing=drop_existing)
+f = db.createFolder(fname, owner=owner, grants = {'r':grants_r, 'w':grants_w}, drop_existing=drop_existing,
+            partitioning=partitioning)
 
 print("Folder %s created" % (fname,))
 
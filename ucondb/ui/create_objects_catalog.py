@@ -0,0 +1,62 @@
+from getopt import getopt
+from UConDB import UConDB
+from UCon_psql import UCDPostgresDataStorage
+
+import sys
+
+Usage = """
+python create_objects_catalog.py [options] <database name> [<namespace>.]<folder_name> ...
+python create_objects_catalog.py [options] -a <database name> <namespace>
+
+Creates or rebuilds the objects catalog and latest versions tables for existing folders
+       
+options:
+    -h <host>
+    -p <port>
+    -U <user>
+    -w <password>
+    
+    -a              - all folders in the namespace
+    -R <user>,...   - DB users to grant read permissions to
+    -W <user>,...   - DB users to grant write permissions to
+"""
+
+dbcon = []
+
+opts, args = getopt(sys.argv[1:], 'h:U:w:p:aR:W:')
+
+if len(args) < 2 or args[0] == 'help':
+    print(Usage)
+    sys.exit(0)
+
+opts = dict(opts)
+
+if "-h" in opts:    dbcon.append("host=%s" % (opts["-h"],))
+if "-p" in opts:    dbcon.append("port=%s" % (opts["-p"],))
+if "-U" in opts:    dbcon.append("user=%s" % (opts["-U"],))
+if "-w" in opts:    dbcon.append("password=%s" % (opts["-w"],))
+grants_r = [x for x in opts.get("-R","").split(",") if x]
+grants_w = [x for x in opts.get("-W","").split(",") if x]
+
+dbcon.append("dbname=%s" % (args[0],))
+
+dbcon = ' '.join(dbcon)
+
+ds = UCDPostgresDataStorage(dbcon)
+db = UConDB(dbcon, ds)
+
+if "-a" in opts:
+    folders = db.listFolders(args[1])
+else:
+    folders = []
+    for fname in args[1:]:
+        f = db.getFolder(fname)
+        if f is None:
+            print("Folder %s not found" % (fname,))
+            sys.exit(1)
+        folders.append(f)
+
+for f in folders:
+    f.createObjectsCatalog(grants = {'r':grants_r, 'w':grants_w})
+    f.createLatestTable(grants = {'r':grants_r, 'w':grants_w})
+    print("Objects catalog for folder %s created, %d objects" % (f.Name, f.objectCount()))
@@ -0,0 +1,57 @@
+from getopt import getopt
+from UConDB import UConDB
+from UCon_psql import UCDPostgresDataStorage
+
+import sys
+
+Usage = """
+python create_validity_index.py [options] <database name> [<namespace>.]<folder_name> ...
+python create_validity_index.py [options] -a <database name> <namespace>
+
+Computes validity intervals of all versions and creates the validity interval index for existing folders
+       
+options:
+    -h <host>
+    -p <port>
+    -U <user>
+    -w <password>
+    
+    -a              - all folders in the namespace
+"""
+
+dbcon = []
+
+opts, args = getopt(sys.argv[1:], 'h:U:w:p:a')
+
+if len(args) < 2 or args[0] == 'help':
+    print(Usage)
+    sys.exit(0)
+
+opts = dict(opts)
+
+if "-h" in opts:    dbcon.append("host=%s" % (opts["-h"],))
+if "-p" in opts:    dbcon.append("port=%s" % (opts["-p"],))
+if "-U" in opts:    dbcon.append("user=%s" % (opts["-U"],))
+if "-w" in opts:    dbcon.append("password=%s" % (opts["-w"],))
+
+dbcon.append("dbname=%s" % (args[0],))
+
+dbcon = ' '.join(dbcon)
+
+ds = UCDPostgresDataStorage(dbcon)
+db = UConDB(dbcon, ds)
+
+if "-a" in opts:
+    folders = db.listFolders(args[1])
+else:
+    folders = []
+    for fname in args[1:]:
+        f = db.getFolder(fname)
+        if f is None:
+            print("Folder %s not found" % (fname,))
+            sys.exit(1)
+        folders.append(f)
+
+for f in folders:
+    f.createValidityIndex()
+    print("Validity index for folder %s created, %d versions" % (f.Name, f.versionCount()))
@@ -0,0 +1,83 @@
+from getopt import getopt
+from UConDB import UConDB
+from UConDB_migrations import UCDSchemaMigrator
+from UCon_psql import UCDPostgresDataStorage
+
+import sys
+
+Usage = """
+python migrate_schema.py [options] <database name> [<namespace>.]<folder_name> ...
+python migrate_schema.py [options] -a <database name> <namespace>
+
+Brings existing folders to the latest schema version. Migrations run online: new tables are filled
+in batches and indexes are built concurrently, without blocking reads and writes to the folders
+       
+options:
+    -h <host>
+    -p <port>
+    -U <user>
+    -w <password>
+    
+    -a              - all outdated folders in the namespace
+    -l              - list outdated folders and their schema versions, do not migrate
+    -R <user>,...   - DB users to grant read permissions for new tables to
+    -W <user>,...   - DB users to grant write permissions for new tables to
+"""
+
+dbcon = []
+
+opts, args = getopt(sys.argv[1:], 'h:U:w:p:alR:W:')
+
+if len(args) < 2 or args[0] == 'help':
+    print(Usage)
+    sys.exit(0)
+
+opts = dict(opts)
+
+if "-h" in opts:    dbcon.append("host=%s" % (opts["-h"],))
+if "-p" in opts:    dbcon.append("port=%s" % (opts["-p"],))
+if "-U" in opts:    dbcon.append("user=%s" % (opts["-U"],))
+if "-w" in opts:    dbcon.append("password=%s" % (opts["-w"],))
+
+dbcon.append("dbname=%s" % (args[0],))
+
+dbcon = ' '.join(dbcon)
+
+grants = {'r': [x for x in opts.get("-R", "").split(",") if x], 'w': [x for x in opts.get("-W", "").split(",") if x]}
+
+ds = UCDPostgresDataStorage(dbcon)
+db = UConDB(dbcon, ds)
+migrator = UCDSchemaMigrator(db, grants=grants)
+
+if "-a" in opts:
+    folders = migrator.outdatedFolders(args[1])
+else:
+    folders = []
+    for fname in args[1:]:
+        f = db.getFolder(fname)
+        if f is None:
+            print("Folder %s not found" % (fname,))
+            sys.exit(1)
+        folders.append((f, migrator.schemaVersion(f)))
+
+latest = migrator.latestVersion()
+
+if "-l" in opts:
+    for f, version in folders:
+        print("%-40s %d/%d" % (f.Name, version, latest))
+    sys.exit(0)
+
+def progress(folder_name, description, phase, done, total):
+    if phase == "start":
+        print("%s: %s..." % (folder_name, description))
+    elif total:
+        print("%s:   %s: %s/%s" % (folder_name, phase, done, total))
+    else:
+        print("%s:   %s: %s" % (folder_name, phase, done))
+
+for f, version in folders:
+    if version >= latest:
+        print("%s: schema version %d is the latest" % (f.Name, version))
+        continue
+    version = migrator.migrate(f, progress=progress)
+    print("%s: migrated to schema version %d" % (f.Name, version))
@@ -0,0 +1,70 @@
+from getopt import getopt
+from UConDB import UConDB
+from UCon_psql import UCDPostgresDataStorage
+
+import sys
+
+Usage = """
+python partition_folder.py [options] -P <partitioning> <database name> [<namespace>.]<folder_name> ...
+python partition_folder.py [options] -A <periods> <database name> [<namespace>.]<folder_name> ...
+
+Migrates existing folders to partitioned versions table while they are in use,
+or creates tr range partitions for the next periods
+       
+options:
+    -h <host>
+    -p <port>
+    -U <user>
+    -w <password>
+    
+    -P <partitioning>   - tr:month, tr:year or object:<number of partitions>
+    -b <batch size>     - number of versions copied per transaction, default 10000
+    -A <periods>        - create tr range partitions for the next <periods> months or years
+"""
+
+dbcon = []
+
+opts, args = getopt(sys.argv[1:], 'h:U:w:p:P:b:A:')
+
+opts = dict(opts)
+
+if len(args) < 2 or args[0] == 'help' or not ("-P" in opts or "-A" in opts):
+    print(Usage)
+    sys.exit(0)
+
+if "-h" in opts:    dbcon.append("host=%s" % (opts["-h"],))
+if "-p" in opts:    dbcon.append("port=%s" % (opts["-p"],))
+if "-U" in opts:    dbcon.append("user=%s" % (opts["-U"],))
+if "-w" in opts:    dbcon.append("password=%s" % (opts["-w"],))
+
+dbcon.append("dbname=%s" % (args[0],))
+
+dbcon = ' '.join(dbcon)
+
+ds = UCDPostgresDataStorage(dbcon)
+db = UConDB(dbcon, ds)
+
+folders = []
+for fname in args[1:]:
+    f = db.getFolder(fname)
+    if f is None:
+        print("Folder %s not found" % (fname,))
+        sys.exit(1)
+    folders.append(f)
+
+def progress(phase, done, total):
+    if phase == "copy":
+        print("  copied versions with id up to %d of %d" % (done, total))
+    elif phase == "changes":
+        print("  copied %d changed versions" % (done,))
+    else:
+        print("  new table is in use")
+
+for f in folders:
+    if "-A" in opts:
+        created = f.addPartitions(int(opts["-A"]))
+        print("Folder %s: %d partitions created" % (f.Name, len(created)))
+    else:
+        print("Folder %s: migrating to %s partitioning..." % (f.Name, opts["-P"]))
+        f.migrateToPartitioned(opts["-P"], batch_size=int(opts.get("-b", 10000)), progress=progress)
+        print("Folder %s partitioned. The old versions table %s_versions_unpartitioned can be dropped" % (f.Name, f.Name))
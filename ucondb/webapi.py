@@ -35,7 +35,7 @@ class UConDBClient(object):
         """
 
         self.URL = server_url
-        self.Timeout = 5
+        self.Timeout = timeout
         self.Username = username
         self.Password = password
         
@@ -166,6 +166,7 @@ class UConDBClient(object):
         :param object_name: name of the object (string)
         :param keys: list of version keys (strings). object_name must be specified. If keys present, tvs, tr, tag are ignored
         :param tvs: list of version Tv's (floats). object_name must be specified. tr, tag may be used.
+            The versions are returned sorted by Tv, each with "lookup_tv" set to the requested Tv. Tv's with no version are absent from the output
         :param ids: list of version ids (ints). object_name, keys, tvs, tr, tag are ignored.
         :param tr: float - record time. Only versions recorded at or before ``tr`` time will be returned
         :param tr_since: float - record time. Only versions recorded after ``tr_since`` time will be returned
@@ -230,6 +231,44 @@ class UConDBClient(object):
         out = self.unpack_content(response)
         return out
         
+    def resolve_versions(self, folder_name, lookups, tr=None, tag=None):
+        """
+        Finds versions of multiple objects valid at given Tv's in one request
+
+        :param folder_name: str - name of the folder
+        :param lookups: list of (object_name, tv) pairs
+        :param tr: float - record time. Only versions recorded before ``tr`` time will be considered
+        :param tag: string - only versions with this tag will be considered
+        :returns: generator of dictionaries with version metadata, each having "lookup_tv" set to the requested Tv. If a version is not found for a pair, it will be absent from the output.
+        """
+        url = self.URL + f"/resolve_versions?folder={folder_name}"
+        tr = timestamp(tr)
+        if tr is not None:
+            url += "&tr="+str(tr)
+        if tag is not None:
+            url += "&tag="+tag
+        data = json.dumps({"lookups":[[o, float(tv)] for o, tv in lookups]})
+        response = self.post_request(url, data, stream=True)
+        if response.status_code != 200:
+            raise WebClientError(response.status_code, url, response.text)
+        return self.unpack_content(response)
+
+    def latest_versions(self, folder_name, object_names=None):
+        """
+        Returns metadata of the latest versions of all objects in the folder or of the listed objects
+
+        :param folder_name: str - name of the folder
+        :param object_names: list of strings - names of the objects. If None, all objects in the folder
+        :returns: generator of dictionaries with version metadata, sorted by object name
+        """
+        url = self.URL + f"/latest_versions?folder={folder_name}"
+        if object_names is not None:
+            url += "&objects=" + ",".join(object_names)
+        response = self.get_request(url, stream=True)
+        if response.status_code != 200:
+            raise WebClientError(response.status_code, url, response.text)
+        return self.unpack_content(response)
+
     def get_data_bulk(self, folder_name, version_ids=None, keys=None):
         """
         Retrieves data BLOBs for multiple object versions
@@ -313,6 +352,38 @@ class UConDBClient(object):
             version_info["data"] = data
         return version_info
 
+    def tag_versions(self, folder_name, tag, ids=None, keys=None, tv=None, tr=None, object_names=None):
+        """
+        Adds the tag to multiple versions in one request. The versions are specified by one of:
+
+        :param folder_name: str - name of the folder
+        :param tag: str - the tag
+        :param ids: list of version ids (ints)
+        :param keys: list of (object_name, key) pairs
+        :param tv: float - tag versions effective at this Tv. ``tr`` and ``object_names`` can be used
+        :param tr: float or datetime - only versions recorded before ``tr`` will be considered
+        :param object_names: list of strings - objects to tag versions of, default: all objects in the folder
+        :returns: list of ids of newly tagged versions
+
+        This method requires that the client was initialzied with username and password
+        """
+        if self.Username is None or self.Password is None:
+            raise RuntimeError("Username and password must be supplied")
+        from requests.auth import HTTPDigestAuth
+        if ids is not None:
+            specs = {"ids": list(ids)}
+        elif keys is not None:
+            specs = {"keys": [[o, k] for o, k in keys]}
+        elif tv is not None:
+            specs = {"tv": float(tv), "tr": timestamp(tr), "objects": object_names}
+        else:
+            raise ValueError("One of ids, keys or tv must be specified")
+        url = f"{self.URL}/tag?folder={folder_name}&tag={tag}"
+        response = self.post_request(url, json.dumps(specs), verify=False, auth=HTTPDigestAuth(self.Username, self.Password))
+        if response.status_code != 200:
+            raise WebClientError(response.status_code, url, response.text)
+        return response.json()
+
     def put(self, folder_name, object_name, data, tv=None, tags=None, key=None, override_key=False):
         """
         Stores new version for the object